@@ -0,0 +1,4 @@
+try:
+    from .celery import app as celery_app
+except ImportError:  # Celery is optional, the local job executor doesn't need it
+    celery_app = None
@@ -62,6 +62,7 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "simulation.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -69,8 +70,9 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware", 
+    "simulation.middleware.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "simulation.middleware.SimulationTimingMiddleware",
 ]
 
 
@@ -185,3 +187,113 @@ LOGGING = {
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+
+# Simulation
+SIMULATION_MODEL_CACHE_SIZE = int(os.getenv('SIMULATION_MODEL_CACHE_SIZE', 8))
+SIMULATION_MODEL_CACHE_MAX_MB = int(os.getenv('SIMULATION_MODEL_CACHE_MAX_MB', 512))
+
+# Background simulation jobs: 'local' (process pool in the web process),
+# 'database' (run `manage.py simulation_worker`) or 'celery'
+SIMULATION_JOB_BACKEND = os.getenv('SIMULATION_JOB_BACKEND', 'local')
+SIMULATION_JOB_WORKERS = int(os.getenv('SIMULATION_JOB_WORKERS', 2))
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+SIMULATION_BATCH_MAX_PROCESSES = int(os.getenv('SIMULATION_BATCH_MAX_PROCESSES', 4))
+SIMULATION_BATCH_MAX_POINTS = int(os.getenv('SIMULATION_BATCH_MAX_POINTS', 500))
+SIMULATION_COMPARE_MAX_MODELS = int(os.getenv('SIMULATION_COMPARE_MAX_MODELS', 8))
+
+# Responses from this size up are sent Brotli (if installed) or gzip compressed
+SIMULATION_COMPRESS_MIN_BYTES = int(os.getenv('SIMULATION_COMPRESS_MIN_BYTES', 1024))
+SIMULATION_BROTLI_QUALITY = int(os.getenv('SIMULATION_BROTLI_QUALITY', 4))
+SIMULATION_GZIP_LEVEL = int(os.getenv('SIMULATION_GZIP_LEVEL', 6))
+
+# Identical simulate requests are served from this cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'simulation_results': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SIMULATION_RESULT_CACHE_DIR', BASE_DIR / 'cache' / 'results'),
+        'TIMEOUT': int(os.getenv('SIMULATION_RESULT_CACHE_TIMEOUT', 24 * 3600)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('SIMULATION_RESULT_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+SIMULATION_RESULT_CACHE_TIMEOUT = CACHES['simulation_results']['TIMEOUT']
+SIMULATION_RESULT_CACHE_MEMORY_ENTRIES = int(os.getenv('SIMULATION_RESULT_CACHE_MEMORY_ENTRIES', 64))
+CORS_EXPOSE_HEADERS = ['X-Sim-Cache', 'X-Sim-Cache-Key', 'X-Sim-Timing', 'Retry-After', 'X-Sim-Metadata']
+
+# Completed runs: metadata in the database, solution arrays as .npz files here
+SIMULATION_PERSIST_RUNS = os.getenv('SIMULATION_PERSIST_RUNS', 'True') == 'True'
+SIMULATION_RESULTS_DIR = Path(os.getenv('SIMULATION_RESULTS_DIR', BASE_DIR / 'results'))
+
+# Build these (battery_type, model) pairs and run a tiny solve when a worker
+# starts, e.g. SIMULATION_WARMUP_MODELS=lithium-ion:SPM,lithium-ion:DFN
+SIMULATION_WARMUP = os.getenv('SIMULATION_WARMUP', 'False') == 'True'
+SIMULATION_WARMUP_MODELS = [
+    tuple(pair.split(':', 1))
+    for pair in os.getenv('SIMULATION_WARMUP_MODELS', 'lithium-ion:SPM').split(',')
+    if pair
+]
+
+# Server-wide solver defaults, requests can override them with "solver": {...}
+SIMULATION_SOLVER = {
+    'name': os.getenv('SIMULATION_SOLVER', 'default'),  # default, casadi or idaklu
+    'mode': os.getenv('SIMULATION_SOLVER_MODE', 'safe'),  # casadi only
+}
+
+# Limits for "experiment" protocols and uploaded drive cycles
+SIMULATION_EXPERIMENT_MAX_CYCLES = int(os.getenv('SIMULATION_EXPERIMENT_MAX_CYCLES', '100'))
+SIMULATION_DRIVE_CYCLE_MAX_ROWS = int(os.getenv('SIMULATION_DRIVE_CYCLE_MAX_ROWS', '100000'))
+
+# Cycle ageing jobs checkpoint to SIMULATION_RESULTS_DIR/checkpoints every N cycles
+SIMULATION_CYCLING_MAX_CYCLES = int(os.getenv('SIMULATION_CYCLING_MAX_CYCLES', '5000'))
+SIMULATION_CHECKPOINT_CYCLES = int(os.getenv('SIMULATION_CHECKPOINT_CYCLES', '50'))
+
+# Parameter fitting jobs, and how often /api/jobs/<id>/events/ polls for progress
+SIMULATION_FITTING_MAX_EVALUATIONS = int(os.getenv('SIMULATION_FITTING_MAX_EVALUATIONS', '200'))
+SIMULATION_JOB_EVENTS_INTERVAL = float(os.getenv('SIMULATION_JOB_EVENTS_INTERVAL', '1.0'))
+# Job event streams end after this long; EventSource clients reconnect
+SIMULATION_JOB_EVENTS_MAX_SECONDS = float(os.getenv('SIMULATION_JOB_EVENTS_MAX_SECONDS', '300'))
+
+# Trained preview surrogates, see `python manage.py train_surrogate`
+SIMULATION_SURROGATE_DIR = Path(os.getenv('SIMULATION_SURROGATE_DIR', SIMULATION_RESULTS_DIR / 'surrogates'))
+# Training solves its samples in its own workers, each under this time limit
+SIMULATION_SURROGATE_TIMEOUT = float(os.getenv('SIMULATION_SURROGATE_TIMEOUT', '3600'))
+
+# Per-stage timings in an X-Sim-Timing header on simulate responses, and an
+# optional bearer token for scraping /api/metrics/
+SIMULATION_TIMING_HEADER = os.getenv('SIMULATION_TIMING_HEADER', 'False') == 'True'
+SIMULATION_METRICS_TOKEN = os.getenv('SIMULATION_METRICS_TOKEN', '')
+
+# Admission control: simulations running at once in each process (default one
+# per CPU), per user, how many may wait and for how long before a 429, and
+# the CPU seconds each user may use per quota window (0 turns quotas off)
+SIMULATION_MAX_CONCURRENT = int(os.getenv('SIMULATION_MAX_CONCURRENT', '0')) or os.cpu_count() or 2
+SIMULATION_USER_MAX_CONCURRENT = int(os.getenv('SIMULATION_USER_MAX_CONCURRENT', '2'))
+SIMULATION_QUEUE_MAX = int(os.getenv('SIMULATION_QUEUE_MAX', '32'))
+SIMULATION_QUEUE_TIMEOUT = float(os.getenv('SIMULATION_QUEUE_TIMEOUT', '30'))
+SIMULATION_USER_CPU_SECONDS = float(os.getenv('SIMULATION_USER_CPU_SECONDS', '600'))
+SIMULATION_QUOTA_WINDOW = float(os.getenv('SIMULATION_QUOTA_WINDOW', '3600'))
+
+# Simulate, stream and sensitivity runs happen in supervised child processes
+# (SIMULATION_MAX_CONCURRENT of them, reused) that are killed after
+# SIMULATION_TIMEOUT seconds or past SIMULATION_MAX_RSS_MB, and replaced
+# after SIMULATION_WORKER_MAX_TASKS runs (0 for never)
+SIMULATION_ISOLATE = os.getenv('SIMULATION_ISOLATE', 'True') == 'True'
+SIMULATION_TIMEOUT = float(os.getenv('SIMULATION_TIMEOUT', '120'))
+SIMULATION_MAX_RSS_MB = int(os.getenv('SIMULATION_MAX_RSS_MB', '2048'))
+SIMULATION_WORKER_MAX_TASKS = int(os.getenv('SIMULATION_WORKER_MAX_TASKS', '100'))
+# A batch or comparison holds one admission slot, so it only spreads over
+# this many supervised workers at a time
+SIMULATION_REQUEST_MAX_WORKERS = int(os.getenv('SIMULATION_REQUEST_MAX_WORKERS', '2'))
+
+# Chatbot: OPENAI_BASE_URL points the client at any OpenAI compatible server,
+# e.g. http://127.0.0.1:8001/v1 for `manage.py mock_llm`
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')
+OPENAI_CHAT_MODEL = os.getenv('OPENAI_CHAT_MODEL', 'gpt-3.5-turbo')
+OPENAI_MAX_TOKENS = int(os.getenv('OPENAI_MAX_TOKENS', '1000'))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
@@ -0,0 +1,485 @@
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils import timezone
+
+from .cycling import parse_cycling
+from .pybamm_runner import get_duration, get_model_class, make_model
+from .supervisor import consumed_cpu
+
+logger = logging.getLogger(__name__)
+
+# Relative cost of a model against SPM, roughly from benchmark_simulation
+MODEL_WEIGHTS = {
+    "SPM": 1,
+    "LOQS": 1,
+    "SPMe": 2,
+    "Composite": 2,
+    "Full": 4,
+    "DFN": 5,
+    "BasicDFN": 5,
+    "MPM": 8,
+    "MSMR": 8,
+}
+# Seconds on one core for an SPM at its default mesh
+BUILD_SECONDS = 0.3
+SOLVE_SECONDS_PER_HOUR = 0.05
+# Experiments end when their steps do, assume this long per step
+EXPERIMENT_STEP_HOURS = 0.5
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class Overloaded(Exception):
+    """The request can't run now; retry after ``retry_after`` seconds.
+    ``reason`` is "quota" or "busy", or "cost" with no ``retry_after`` for
+    a request that costs more than the whole quota and can never run."""
+
+    def __init__(self, message, retry_after, reason="busy"):
+        super().__init__(message)
+        self.retry_after = None if retry_after is None else max(1, int(math.ceil(retry_after)))
+        self.reason = reason
+
+
+@lru_cache(maxsize=None)
+def state_layout(battery_type, selected_model):
+    """A model's default mesh points and, for each state variable, the
+    spatial variables of every domain at each level it spans."""
+    model = make_model(battery_type, selected_model)
+    geometry = model.default_geometry
+
+    def spatial(domain):
+        # Lumped domains, such as a 0D current collector, are a single point
+        return tuple(name for name, extent in geometry.get(domain, {}).items() if "min" in extent)
+
+    shapes = tuple(
+        tuple(tuple(spatial(domain) for domain in level) for level in variable.domains.values() if level)
+        for variable in itertools.chain(model.rhs, model.algebraic)
+    )
+    return model.default_var_pts, shapes
+
+
+def state_size(battery_type, selected_model, var_pts=None):
+    """Number of states the discretised model has on ``var_pts``."""
+    defaults, shapes = state_layout(battery_type, selected_model)
+    points = {**defaults, **{name: max(int(n), 1) for name, n in (var_pts or {}).items()}}
+    return sum(
+        math.prod(
+            sum(math.prod(points.get(name, 1) for name in names) for names in level)
+            for level in shape
+        )
+        for shape in shapes
+    )
+
+
+def estimate_cost(data):
+    """Estimated CPU seconds for a simulate payload.
+
+    Scales a per-model weight by the simulated hours (or experiment steps
+    and cycles) and by how many more states than at the default mesh the
+    model has. Solving grows about linearly with the states, building and
+    discretising more slowly.
+    """
+    battery_type = data.get("battery_type")
+    selected_model = data.get("selected_model")
+    get_model_class(battery_type, selected_model)
+    weight = MODEL_WEIGHTS.get(selected_model, 5)
+
+    experiment = data.get("experiment")
+    if experiment is not None:
+        spec = {"steps": experiment} if isinstance(experiment, list) else experiment
+        steps = len(spec.get("steps") or [None])
+        hours = steps * int(spec.get("cycles", 1)) * EXPERIMENT_STEP_HOURS
+    else:
+        hours = get_duration(data.get("params", {})) / 3600
+
+    mesh = 1.0
+    if data.get("var_pts"):
+        mesh = state_size(battery_type, selected_model, data["var_pts"]) / state_size(
+            battery_type, selected_model
+        )
+    mesh = max(mesh, 0.1)
+    return weight * (BUILD_SECONDS * math.sqrt(mesh) + SOLVE_SECONDS_PER_HOUR * max(hours, 0) * mesh)
+
+
+def check_quota(user, cost):
+    """Raise Overloaded if ``cost`` more CPU seconds would take the user over
+    SIMULATION_USER_CPU_SECONDS within the last SIMULATION_QUOTA_WINDOW, or
+    if ``cost`` alone is over it."""
+    from .models import APIUsage
+
+    quota = getattr(settings, "SIMULATION_USER_CPU_SECONDS", 600)
+    window = getattr(settings, "SIMULATION_QUOTA_WINDOW", 3600)
+    if not quota or user.is_staff:
+        return
+    if cost > quota:
+        raise Overloaded(
+            f"This request needs about {cost:.0f} CPU seconds, more than the quota of "
+            f"{quota:g}s per {window:g}s. Use a shorter run, fewer points or a coarser mesh.",
+            None,
+            reason="cost",
+        )
+    since = timezone.now() - timedelta(seconds=window)
+    usage = list(
+        APIUsage.objects.filter(user=user, timestamp__gte=since)
+        .order_by("timestamp")
+        .values_list("timestamp", "cpu_seconds")
+    )
+    used = sum(seconds for _, seconds in usage)
+    if used + cost <= quota:
+        return
+    # Wait until enough of the oldest usage falls out of the window
+    retry_after = window
+    remaining = used
+    for timestamp, seconds in usage:
+        remaining -= seconds
+        if remaining + cost <= quota:
+            retry_after = (timestamp - since).total_seconds()
+            break
+    raise Overloaded(
+        f"CPU quota of {quota:g}s per {window:g}s reached ({used:.1f}s used, "
+        f"this request needs about {cost:.1f}s)",
+        retry_after,
+        reason="quota",
+    )
+
+
+class Scheduler:
+    """Admits at most ``capacity`` simulations at once in this process.
+
+    Each user can hold ``per_user`` slots. Requests that can't start wait
+    in a queue ordered by priority, then by estimated cost (cheap first) and
+    arrival; entries of users already at their limit are skipped over. A
+    full queue or a wait longer than ``timeout`` raises Overloaded with a
+    Retry-After estimate from the work ahead.
+    """
+
+    def __init__(self, capacity, per_user=2, max_queue=32, timeout=30):
+        self.capacity = capacity
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        # (priority, cost, arrival, user id), short enough to scan
+        self._queue = []
+        self._order = itertools.count()
+        self._running = {}  # user id -> slots held
+        self._costs = {}  # arrival -> estimated cost of running work
+
+    def running(self):
+        return sum(self._running.values())
+
+    def queued(self):
+        return len(self._queue)
+
+    def _next(self):
+        eligible = [e for e in self._queue if self._running.get(e[3], 0) < self.per_user]
+        return min(eligible) if eligible else None
+
+    def _retry_after(self):
+        # Work ahead spread over the slots
+        pending = sum(self._costs.values()) + sum(entry[1] for entry in self._queue)
+        return pending / max(self.capacity, 1)
+
+    def acquire(self, user_id, cost, priority=1):
+        """Block until a slot is free and return a handle for release()."""
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                raise Overloaded("Simulation queue is full", self._retry_after())
+            entry = (priority, cost, next(self._order), user_id)
+            self._queue.append(entry)
+            deadline = time.monotonic() + self.timeout
+            while not (self.running() < self.capacity and self._next() == entry):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(entry)
+                    self._condition.notify_all()
+                    raise Overloaded(
+                        "Server is busy, simulation was not started", self._retry_after()
+                    )
+                self._condition.wait(remaining)
+            self._queue.remove(entry)
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+            self._costs[entry[2]] = cost
+            # The next in line may be able to start too
+            self._condition.notify_all()
+            return entry
+
+    def release(self, handle):
+        _, _, arrival, user_id = handle
+        with self._condition:
+            self._costs.pop(arrival, None)
+            self._running[user_id] -= 1
+            if not self._running[user_id]:
+                del self._running[user_id]
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, user_id, cost, priority=1):
+        handle = self.acquire(user_id, cost, priority)
+        try:
+            yield
+        finally:
+            self.release(handle)
+
+
+scheduler = Scheduler(
+    capacity=getattr(settings, "SIMULATION_MAX_CONCURRENT", None) or os.cpu_count() or 2,
+    per_user=getattr(settings, "SIMULATION_USER_MAX_CONCURRENT", 2),
+    max_queue=getattr(settings, "SIMULATION_QUEUE_MAX", 32),
+    timeout=getattr(settings, "SIMULATION_QUEUE_TIMEOUT", 30),
+)
+
+
+def request_priority(user, data):
+    # Staff can jump the queue, anyone can step back with "priority": "low"
+    priority = PRIORITIES.get(data.get("priority"), PRIORITIES["normal"])
+    return priority if user.is_staff else max(priority, PRIORITIES["normal"])
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR") or None
+
+
+def record_usage(
+    user, endpoint, method, status_code, execution_time, cpu_seconds, cost, request=None, job=None
+):
+    from .models import APIUsage
+
+    APIUsage.objects.create(
+        job=job,
+        user=user,
+        endpoint=endpoint[:100],
+        method=method,
+        status_code=status_code,
+        execution_time=execution_time,
+        cpu_seconds=cpu_seconds,
+        estimated_cost=cost,
+        user_agent=request.META.get("HTTP_USER_AGENT", "")[:200] if request else "",
+        ip_address=client_ip(request) if request else None,
+    )
+
+
+def check_active_jobs(user):
+    """Raise Overloaded if ``user`` already has SIMULATION_USER_MAX_CONCURRENT
+    jobs pending or running."""
+    from .models import APIUsage, SimulationJob
+
+    limit = getattr(settings, "SIMULATION_USER_MAX_CONCURRENT", 2)
+    active = SimulationJob.objects.filter(user=user, status__in=("pending", "running"))
+    if not limit or active.count() < limit:
+        return
+    # The cheapest of them is likely the first to free a place
+    costs = APIUsage.objects.filter(job__in=active).values_list("estimated_cost", flat=True)
+    raise Overloaded(
+        f"{limit} jobs are already pending or running, wait for one to finish",
+        min(costs, default=60),
+    )
+
+
+def reserve_job(job, cost, request=None):
+    """Count a job's estimated cost against its user's quota from submit on,
+    until settle_job() swaps in what it used."""
+    record_usage(job.user, f"job:{job.kind}", "JOB", 202, 0, cost, cost, request, job=job)
+
+
+def settle_job(job, status_code, execution_time, cpu_seconds):
+    from .models import APIUsage
+
+    settled = APIUsage.objects.filter(job=job).update(
+        status_code=status_code,
+        execution_time=execution_time,
+        cpu_seconds=cpu_seconds,
+        timestamp=timezone.now(),
+    )
+    if not settled:
+        # Submitted without a reservation, e.g. before reservations existed
+        record_usage(
+            job.user,
+            f"job:{job.kind}",
+            "JOB",
+            status_code,
+            execution_time,
+            cpu_seconds,
+            estimate_job_cost(job.kind, job.request),
+            job=job,
+        )
+
+
+class Admission:
+    """Quota check and scheduler slot for one request.
+
+    Raises Overloaded from the constructor when the request can't run. Wrap
+    the work in measure() so its CPU time is counted, then call finish()
+    once to free the slot and record the usage. A ``cost`` of 0 (a cached
+    result) skips both the quota and the queue.
+    """
+
+    def __init__(self, request, data, cost=None):
+        self.request = request
+        self.cost = estimate_cost(data) if cost is None else cost
+        self.handle = None
+        self.cpu_seconds = 0.0
+        self.status_code = 200
+        self.finished = False
+        if self.cost:
+            check_quota(request.user, self.cost)
+            self.handle = scheduler.acquire(
+                request.user.id, self.cost, request_priority(request.user, data)
+            )
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def measure(self):
+        # Thread CPU time, so concurrent requests in the worker don't count,
+        # plus whatever supervised child processes ran for this thread
+        started = time.thread_time() + consumed_cpu()
+        try:
+            yield
+        finally:
+            self.cpu_seconds += time.thread_time() + consumed_cpu() - started
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        if self.handle is not None:
+            scheduler.release(self.handle)
+            self.handle = None
+        try:
+            record_usage(
+                self.request.user,
+                self.request.path,
+                self.request.method,
+                self.status_code,
+                time.perf_counter() - self.started,
+                self.cpu_seconds,
+                self.cost,
+                self.request,
+            )
+        except Exception:
+            logger.exception("Couldn't record API usage")
+
+
+class AdmittedStream:
+    """Streaming response body that finishes its admission when the response
+    is closed, even if the client left before the first chunk."""
+
+    def __init__(self, chunks, admission):
+        self.chunks = chunks
+        self.admission = admission
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        try:
+            self.chunks.close()
+        finally:
+            self.admission.finish()
+
+
+class AsyncAdmittedStream(AdmittedStream):
+    """AdmittedStream for ASGI servers, which buffer a sync body until it
+    ends. Each chunk is pulled in a worker thread instead, so events go out
+    as they are produced.
+
+    Django closes the response when the client disconnects. If a chunk is
+    still being produced then, the thread producing it does the closing
+    once it is done, because a running generator can't be closed.
+    """
+
+    def __init__(self, chunks, admission):
+        super().__init__(chunks, admission)
+        self._lock = threading.Lock()
+        self._busy = False
+        self._closing = False
+
+    # Django prefers a sync body when the object offers both
+    __iter__ = None
+
+    def _next(self):
+        with self._lock:
+            if self._closing:
+                return None
+            self._busy = True
+        try:
+            chunk = next(self.chunks, None)
+        finally:
+            with self._lock:
+                self._busy = False
+                closing = self._closing
+        if closing:
+            super().close()
+            return None
+        return chunk
+
+    async def __aiter__(self):
+        while True:
+            chunk = await sync_to_async(self._next, thread_sensitive=False)()
+            if chunk is None:
+                return
+            yield chunk
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            if self._busy:
+                return
+        super().close()
+
+
+def is_asgi(request):
+    # Django buffers a streaming body unless it matches the server: async
+    # under ASGI, sync under WSGI
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+def admitted_stream(chunks, admission):
+    """Response body for ``chunks`` that finishes ``admission`` when closed,
+    async when the request came in over ASGI."""
+    if is_asgi(admission.request):
+        return AsyncAdmittedStream(chunks, admission)
+    return AdmittedStream(chunks, admission)
+
+
+@contextmanager
+def admitted(request, data, cost=None, measure=True):
+    """Run a synchronous request under an Admission. With ``measure=False``
+    the caller sets ``cpu_seconds``, for work done in other processes."""
+    admission = Admission(request, data, cost)
+    try:
+        if measure:
+            with admission.measure():
+                yield admission
+        else:
+            yield admission
+    except ValueError:
+        admission.status_code = 400
+        raise
+    except Exception:
+        admission.status_code = 500
+        raise
+    finally:
+        admission.finish()
+
+
+def estimate_job_cost(kind, data):
+    # Fits solve up to max_evaluations times, cycling scales with its cycles
+    if kind == "fitting":
+        return estimate_cost(data) * int(data.get("max_evaluations", 50))
+    if kind == "cycling":
+        config = parse_cycling(data)
+        protocol = {**config["protocol"], "cycles": config["cycles"]}
+        return estimate_cost({**data, "experiment": protocol})
+    return estimate_cost(data)
@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class SimulationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "simulation"
+
+    def ready(self):
+        # Off by default so migrate and other commands stay fast
+        if getattr(settings, "SIMULATION_WARMUP", False):
+            from .supervisor import get_supervised_pool, isolated
+            from .warmup import warm_up
+
+            if isolated():
+                # Models are built in the supervised workers, which warm up
+                # as they start; this process only needs the catalog
+                warm_up(models=[])
+                get_supervised_pool().start()
+            else:
+                warm_up()
@@ -0,0 +1,180 @@
+import itertools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+from django.conf import settings
+
+from .jobs import init_worker
+from .parameter_sets import resolve_parameter_set
+from .pybamm_runner import get_duration, get_model_class, solve
+from .solvers import resolve_solver_options
+from .supervisor import SimulationAborted, isolated, map_supervised
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, "SIMULATION_BATCH_MAX_PROCESSES", 4),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+            )
+        return _pool
+
+
+def run_calls(func, calls, timeout=None):
+    """Call ``func(*args)`` for every tuple in ``calls``, returning the
+    results in order.
+
+    With SIMULATION_ISOLATE the calls run in supervised workers, each under
+    the wall-clock and memory limits of a simulate run. Otherwise a single
+    call runs inline and several go to the batch pool. The pool can't kill
+    a running call, so past SIMULATION_TIMEOUT the request gives up and
+    cancels only the calls still queued. A ``timeout`` replaces
+    SIMULATION_TIMEOUT, see map_supervised.
+    """
+    if isolated():
+        return map_supervised(func, calls, timeout)
+    if len(calls) == 1:
+        return [func(*calls[0])]
+    timeout = timeout or getattr(settings, "SIMULATION_TIMEOUT", 120)
+    futures = [get_pool().submit(func, *args) for args in calls]
+    _, pending = wait(futures, timeout=timeout)
+    if pending:
+        for future in pending:
+            future.cancel()
+        raise SimulationAborted(
+            f"Simulation exceeded the {timeout:g}s time limit", "timeout", timeout
+        )
+    return [future.result() for future in futures]
+
+
+def expand_points(grid=None, points=None):
+    # Either an explicit list of overrides or the cartesian product of a grid
+    if points:
+        return [dict(point) for point in points]
+    if grid:
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    raise ValueError("Provide either 'grid' or 'points'")
+
+
+def to_json_list(values):
+    # JSON has no NaN, points past a solver event become null
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def solve_points(
+    battery_type,
+    selected_model,
+    base_params,
+    points,
+    var_pts,
+    time_grid,
+    solver=None,
+    parameter_set=None,
+):
+    """Solve a chunk of sweep points, interpolated onto the shared time grid.
+
+    Runs inside a pool worker, so every point in the chunk shares that
+    worker's cached model. Each result carries the CPU seconds it took.
+    """
+    results = []
+    for point in points:
+        started = time.thread_time()
+        try:
+            solution = solve(
+                battery_type,
+                {**base_params, **point},
+                selected_model,
+                var_pts,
+                t_eval=[0, time_grid[-1]],
+                solver_options=solver,
+                parameter_set=parameter_set,
+            )
+            t = solution["Time [s]"].entries
+            voltage = np.interp(
+                time_grid, t, solution["Voltage [V]"].entries, right=np.nan
+            )
+            results.append(
+                {
+                    "voltage": to_json_list(voltage),
+                    "termination": solution.termination,
+                    "error": None,
+                    "cpu_seconds": time.thread_time() - started,
+                }
+            )
+        except Exception as e:
+            results.append(
+                {
+                    "voltage": [None] * len(time_grid),
+                    "termination": None,
+                    "error": str(e),
+                    "cpu_seconds": time.thread_time() - started,
+                }
+            )
+    return results
+
+
+def run_batch(data, timeout=None):
+    battery_type = data.get("battery_type")
+    selected_model = data.get("selected_model")
+    get_model_class(battery_type, selected_model)
+    resolve_solver_options(data.get("solver"))
+    parameter_set = resolve_parameter_set(battery_type, selected_model, data.get("parameter_set"))
+    if data.get("experiment") is not None:
+        # Sweeps share one fixed time grid, experiments end when their steps do
+        raise ValueError("Batch runs don't support experiments")
+
+    base_params = data.get("params", {})
+    points = expand_points(data.get("grid"), data.get("points"))
+    max_points = getattr(settings, "SIMULATION_BATCH_MAX_POINTS", 500)
+    if len(points) > max_points:
+        raise ValueError(f"Batch has {len(points)} points, the limit is {max_points}")
+
+    duration = get_duration(base_params)
+    time_grid = np.linspace(0, duration, int(data.get("output_points", 200)))
+    processes = max(
+        1,
+        min(
+            int(data.get("processes", 1)),
+            getattr(settings, "SIMULATION_BATCH_MAX_PROCESSES", 4),
+            len(points),
+        ),
+    )
+    # Contiguous chunks so each worker builds a model once and reuses it
+    chunks = np.array_split(np.arange(len(points)), processes)
+    calls = [
+        (
+            battery_type,
+            selected_model,
+            base_params,
+            [points[i] for i in chunk],
+            data.get("var_pts"),
+            time_grid,
+            data.get("solver"),
+            parameter_set,
+        )
+        for chunk in chunks
+    ]
+    results = [r for chunk in run_calls(solve_points, calls, timeout) for r in chunk]
+
+    names = sorted({name for point in points for name in point})
+    return {
+        "status": "success",
+        "summary": f"Batch of {len(points)} simulations completed",
+        "count": len(points),
+        "time": time_grid.tolist(),
+        "inputs": {name: [point.get(name) for point in points] for name in names},
+        "voltage": [r["voltage"] for r in results],
+        "termination": [r["termination"] for r in results],
+        "errors": [r["error"] for r in results],
+        "cpu_seconds": sum(r["cpu_seconds"] for r in results),
+    }
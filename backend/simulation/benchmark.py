@@ -0,0 +1,214 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pybamm
+from django.conf import settings
+
+from .pybamm_runner import chemistries, make_model, model_cache, run_simulation
+
+
+def environment():
+    # What a result depends on besides the code, recorded next to the timings
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "pybamm_version": pybamm.__version__,
+        "numpy_version": np.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def combinations(battery_types=None, models=None):
+    """Every (battery_type, model) pair in the chemistry tables."""
+    for battery_type, (table, _) in chemistries.items():
+        if battery_types and battery_type not in battery_types:
+            continue
+        for selected_model in table:
+            if models and selected_model not in models:
+                continue
+            yield battery_type, selected_model
+
+
+def scaled_mesh(battery_type, selected_model, scale):
+    # None keeps the model defaults, so scale 1 shares the cache with requests
+    if scale == 1:
+        return None
+    defaults = make_model(battery_type, selected_model).default_var_pts
+    return {name: max(3, int(round(points * scale))) for name, points in defaults.items()}
+
+
+def summarize(samples):
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+        "runs": len(samples),
+    }
+
+
+def benchmark_case(battery_type, selected_model, duration, mesh_scale, repeats=3):
+    """Time run_simulation cold (empty model cache) and then warm.
+
+    Cold runs include building and discretising the model, warm runs are
+    what a repeat request costs. Errors are recorded rather than raised so
+    one failing model doesn't end the suite.
+    """
+    case = {
+        "battery_type": battery_type,
+        "selected_model": selected_model,
+        "duration": duration,
+        "mesh_scale": mesh_scale,
+    }
+    params = {"duration": duration}
+    try:
+        var_pts = scaled_mesh(battery_type, selected_model, mesh_scale)
+        model_cache.clear()
+        started = time.perf_counter()
+        cold = run_simulation(battery_type, params, selected_model, var_pts=var_pts)
+        cold_seconds = time.perf_counter() - started
+
+        warm = []
+        stages = {}
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = run_simulation(battery_type, params, selected_model, var_pts=var_pts)
+            warm.append(time.perf_counter() - started)
+            for stage, seconds in result["timings"].items():
+                stages.setdefault(stage, []).append(seconds)
+    except Exception as e:
+        return {**case, "error": f"{type(e).__name__}: {e}"}
+
+    return {
+        **case,
+        "cold": cold_seconds,
+        "cold_timings": cold["timings"],
+        "warm": summarize(warm),
+        "warm_timings": {stage: statistics.median(values) for stage, values in stages.items()},
+        "peak_delta_bytes": cold["memory"]["peak_delta_bytes"],
+        "termination": cold["termination"],
+    }
+
+
+def load_test(body, concurrency=4, requests=20, distinct=True):
+    """POST ``body`` to /api/simulate/ from ``concurrency`` threads through
+    the Django test client and report latency percentiles and throughput.
+
+    Requests run as a staff user in a test database that is created for the
+    run and destroyed after it, so neither the user nor the usage admission
+    records touch the real database. With ``distinct`` each request gets its
+    own C-rate so every one is a result cache miss on a warm model;
+    otherwise repeats hit the cache.
+    """
+    from django.test.utils import setup_databases, teardown_databases
+
+    databases = setup_databases(verbosity=0, interactive=False)
+    try:
+        return run_load(body, concurrency, requests, distinct)
+    finally:
+        teardown_databases(databases, verbosity=0)
+
+
+def run_load(body, concurrency, requests, distinct):
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    # Admission records usage against a real user; staff skip the CPU quota
+    user = User.objects.create(username="benchmark", is_staff=True)
+    host = next((h for h in settings.ALLOWED_HOSTS if h and h != "*"), "testserver")
+    body = {**body, "save": False}
+
+    def send(i):
+        client = APIClient(SERVER_NAME=host.lstrip("."))
+        client.force_authenticate(user)
+        payload = body
+        if distinct:
+            payload = {**body, "params": {**body.get("params", {}), "C-rate": 0.5 + i / requests}}
+        started = time.perf_counter()
+        response = client.post("/api/simulate/", payload, format="json")
+        return time.perf_counter() - started, response.status_code, response.get("X-Sim-Cache")
+
+    # One request first so the model build isn't in the percentiles
+    _, code, _ = send(0)
+    if not 200 <= code < 300:
+        raise RuntimeError(f"Warm-up request failed with {code}")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, range(1, requests + 1)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([latency for latency, _, _ in results])
+    statuses = {}
+    for _, code, cache in results:
+        key = f"{code} {cache}" if cache else str(code)
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        "battery_type": body.get("battery_type"),
+        "selected_model": body.get("selected_model"),
+        "concurrency": concurrency,
+        "requests": requests,
+        "distinct": distinct,
+        "throughput": requests / elapsed,
+        "latency": {
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(latencies.max()),
+        },
+        "responses": statuses,
+        "failures": sum(not 200 <= code < 300 for _, code, _ in results),
+    }
+
+
+def case_key(case):
+    return (case["battery_type"], case["selected_model"], case["duration"], case["mesh_scale"])
+
+
+def compare(baseline, current, threshold=0.2, min_seconds=0.005):
+    """Pair cases of two result files and flag warm medians (and cold runs)
+    that got more than ``threshold`` slower, ignoring differences under
+    ``min_seconds`` which are timer noise. Returns a list of rows."""
+    before = {case_key(case): case for case in baseline["cases"] if "error" not in case}
+    rows = []
+    for case in current["cases"]:
+        old = before.get(case_key(case))
+        if old is None or "error" in case:
+            continue
+        for metric, new_value, old_value in (
+            ("warm", case["warm"]["median"], old["warm"]["median"]),
+            ("cold", case["cold"], old["cold"]),
+        ):
+            ratio = new_value / old_value if old_value else float("inf")
+            rows.append(
+                {
+                    "case": case_key(case),
+                    "metric": metric,
+                    "before": old_value,
+                    "after": new_value,
+                    "ratio": ratio,
+                    "regression": ratio > 1 + threshold and new_value - old_value > min_seconds,
+                }
+            )
+    return rows
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
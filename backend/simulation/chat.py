@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+
+# One client per event loop: its connection pool is tied to the loop that
+# opened it. Under ASGI that is a single client for the whole process.
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=getattr(settings, "OPENAI_API_KEY", "") or "unset",
+            base_url=getattr(settings, "OPENAI_BASE_URL", "") or None,
+            timeout=getattr(settings, "OPENAI_TIMEOUT", 60),
+            max_retries=getattr(settings, "OPENAI_MAX_RETRIES", 2),
+        )
+        _clients[loop] = client
+    return client
+
+
+def build_messages(message):
+    # Client-supplied history isn't forwarded, only the new message
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": message},
+    ]
+
+
+def completion_options():
+    return {
+        "model": getattr(settings, "OPENAI_CHAT_MODEL", "gpt-3.5-turbo"),
+        "max_tokens": getattr(settings, "OPENAI_MAX_TOKENS", 1000),
+        "temperature": 0.7,
+    }
+
+
+async def complete(messages):
+    response = await get_client().chat.completions.create(
+        messages=messages, **completion_options()
+    )
+    return response.choices[0].message.content
+
+
+async def stream_tokens(messages):
+    """Yield the reply's text deltas as the model produces them."""
+    stream = await get_client().chat.completions.create(
+        messages=messages, stream=True, **completion_options()
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        # Stops the upstream generation when the client goes away
+        await stream.close()
@@ -0,0 +1,166 @@
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .batch import run_calls, to_json_list
+from .parameter_sets import resolve_parameter_set
+from .postprocessing import derived_metrics, open_circuit_voltage, resolve_metrics
+from .pybamm_runner import extract_series, get_duration, get_model_class, get_nominal_capacity, solve
+from .solvers import resolve_solver_options
+
+
+def parse_variants(data):
+    """The models to compare, from ``models``: model names using the
+    request's battery_type, or dicts with their own battery_type,
+    selected_model, parameter_set and label."""
+    entries = data.get("models")
+    if not isinstance(entries, list) or len(entries) < 2:
+        raise ValueError("Provide at least two entries in 'models'")
+    max_models = getattr(settings, "SIMULATION_COMPARE_MAX_MODELS", 8)
+    if len(entries) > max_models:
+        raise ValueError(f"Comparison has {len(entries)} models, the limit is {max_models}")
+
+    variants = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"selected_model": entry}
+        if not isinstance(entry, dict):
+            raise ValueError("Each entry in 'models' must be a model name or an object")
+        battery_type = entry.get("battery_type", data.get("battery_type"))
+        selected_model = entry.get("selected_model", data.get("selected_model"))
+        get_model_class(battery_type, selected_model)
+        requested_set = entry.get("parameter_set", data.get("parameter_set"))
+        variants.append(
+            {
+                "battery_type": battery_type,
+                "selected_model": selected_model,
+                "parameter_set": resolve_parameter_set(
+                    battery_type, selected_model, requested_set
+                ),
+                "label": entry.get("label"),
+                "explicit_set": "parameter_set" in entry,
+            }
+        )
+
+    # Default labels only name what differs between the entries
+    chemistries = {v["battery_type"] for v in variants}
+    for variant in variants:
+        if variant["label"] is None:
+            parts = [variant["selected_model"]]
+            if len(chemistries) > 1:
+                parts.insert(0, variant["battery_type"])
+            if variant["explicit_set"]:
+                parts.append(variant["parameter_set"])
+            variant["label"] = " ".join(parts)
+        del variant["explicit_set"]
+    labels = [v["label"] for v in variants]
+    if len(set(labels)) != len(labels):
+        raise ValueError("Models to compare need distinct labels")
+    return variants
+
+
+def solve_variant(
+    variant, params, var_pts, time_grid, solver=None, variables=None, metrics=None
+):
+    """Solve one model and interpolate its series onto the shared time grid.
+
+    Runs inside a worker process, so repeated comparisons reuse that
+    worker's cached models.
+    """
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    timings = {}
+    try:
+        solution = solve(
+            variant["battery_type"],
+            params,
+            variant["selected_model"],
+            var_pts,
+            t_eval=[0, time_grid[-1]],
+            solver_options=solver,
+            timings=timings,
+            variables=variables,
+            parameter_set=variant["parameter_set"],
+        )
+        postprocess_started = time.perf_counter()
+        capacity = get_nominal_capacity(
+            variant["battery_type"], params, variant["selected_model"], variant["parameter_set"]
+        )
+        series = extract_series(solution, capacity, variables)
+        # On the solver's own points, before interpolation
+        result_metrics = derived_metrics(series, open_circuit_voltage(solution), metrics)
+        t = series.pop("Time [s]")
+        aligned = {
+            name: to_json_list(np.interp(time_grid, t, values, right=np.nan))
+            for name, values in series.items()
+        }
+        termination = solution.termination
+        error = None
+        timings["postprocess"] = time.perf_counter() - postprocess_started
+    except Exception as e:
+        aligned, result_metrics, termination, error = {}, {}, None, str(e)
+    timings["total"] = time.perf_counter() - started
+    return {
+        "series": aligned,
+        "metrics": result_metrics,
+        "termination": termination,
+        "error": error,
+        "timings": timings,
+        "cpu_seconds": time.thread_time() - cpu_started,
+    }
+
+
+def run_comparison(data):
+    """Solve the models of a comparison concurrently in worker processes,
+    up to SIMULATION_REQUEST_MAX_WORKERS at a time (see run_calls)."""
+    started = time.perf_counter()
+    variants = parse_variants(data)
+    resolve_solver_options(data.get("solver"))
+    if data.get("experiment") is not None:
+        raise ValueError("Comparisons don't support experiments")
+
+    params = data.get("params", {})
+    time_grid = np.linspace(0, get_duration(params), int(data.get("output_points", 200)))
+    resolve_metrics(data.get("metrics"))
+    args = (
+        params,
+        data.get("var_pts"),
+        time_grid,
+        data.get("solver"),
+        data.get("variables"),
+        data.get("metrics"),
+    )
+    results = run_calls(solve_variant, [(variant, *args) for variant in variants])
+
+    # Variable -> label -> values, null where a model doesn't have it
+    names = []
+    for result in results:
+        names.extend(name for name in result["series"] if name not in names)
+    series = {
+        name: {
+            variant["label"]: result["series"].get(name)
+            for variant, result in zip(variants, results)
+        }
+        for name in names
+    }
+    failed = sum(result["error"] is not None for result in results)
+    return {
+        "status": "success",
+        "summary": f"Compared {len(variants)} models"
+        + (f", {failed} failed" if failed else ""),
+        "time": time_grid.tolist(),
+        "models": [
+            {
+                **variant,
+                "termination": result["termination"],
+                "metrics": result["metrics"],
+                "error": result["error"],
+                "timings": result["timings"],
+            }
+            for variant, result in zip(variants, results)
+        ],
+        "series": series,
+        "cpu_seconds": sum(result["cpu_seconds"] for result in results),
+        "timings": {"total": time.perf_counter() - started},
+    }
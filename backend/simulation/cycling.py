@@ -0,0 +1,210 @@
+import json
+import logging
+import math
+import os
+import pickle
+import shutil
+
+from django.conf import settings
+
+from .experiments import parse_experiment
+from .parameter_sets import get_parameter_values
+from .pybamm_runner import filter_params, get_model_class, get_simulation
+from .storage import results_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUMMARY_VARIABLES = [
+    "Capacity [A.h]",
+    "Loss of lithium inventory [%]",
+    "Loss of capacity to negative SEI [A.h]",
+    "Total capacity lost to side reactions [A.h]",
+    "Throughput capacity [A.h]",
+    "Time [s]",
+]
+
+
+def checkpoint_dir(job_id):
+    return results_dir() / "checkpoints" / str(job_id)
+
+
+def parse_cycling(data):
+    """Validate a cycling request, returning its settings as a dict."""
+    battery_type = data.get("battery_type", "lithium-ion")
+    selected_model = data.get("selected_model", "SPM")
+    get_model_class(battery_type, selected_model)
+    if battery_type != "lithium-ion":
+        raise ValueError("Cycle ageing needs a lithium-ion model")
+
+    protocol = data.get("experiment")
+    if protocol is None:
+        raise ValueError("Cycling needs an 'experiment' describing one cycle")
+    if isinstance(protocol, list):
+        protocol = {"steps": protocol}
+
+    max_cycles = getattr(settings, "SIMULATION_CYCLING_MAX_CYCLES", 5000)
+    cycles = int(data.get("cycles", 100))
+    if not 1 <= cycles <= max_cycles:
+        raise ValueError(f"Cycles must be between 1 and {max_cycles}")
+
+    checkpoint_every = int(
+        data.get("checkpoint_every", getattr(settings, "SIMULATION_CHECKPOINT_CYCLES", 50))
+    )
+    # Checks the protocol and the block size in one go
+    parse_experiment({**protocol, "cycles": checkpoint_every})
+
+    options = dict(data.get("options") or {})
+    options.setdefault("SEI", data.get("sei", "ec reaction limited"))
+
+    return {
+        "battery_type": battery_type,
+        "selected_model": selected_model,
+        "protocol": protocol,
+        "cycles": cycles,
+        "checkpoint_every": checkpoint_every,
+        "options": options,
+        "summary_variables": list(
+            data.get("summary_variables") or DEFAULT_SUMMARY_VARIABLES
+        ),
+        "min_capacity_percent": data.get("min_capacity_percent"),
+    }
+
+
+def load_checkpoint(path):
+    """Return (cycles_done, last_state, summary rows), empty if there's none."""
+    state_file = path / "state.pkl"
+    if not state_file.exists():
+        return 0, None, []
+    with open(state_file, "rb") as f:
+        cycles_done, last_state = pickle.load(f)
+
+    rows = []
+    summary_file = path / "summary.jsonl"
+    if summary_file.exists():
+        with open(summary_file) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    # Rows written after the last saved state get solved again
+    return cycles_done, last_state, rows[:cycles_done]
+
+
+def save_checkpoint(path, cycles_done, last_state, new_rows):
+    # Summary rows first, then the state, so a crash in between only repeats cycles
+    with open(path / "summary.jsonl", "a") as f:
+        for row in new_rows:
+            f.write(json.dumps(row) + "\n")
+    tmp = path / "state.pkl.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump((cycles_done, last_state), f)
+    os.replace(tmp, path / "state.pkl")
+
+
+def to_json_value(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def run_cycling(job_id, data, on_progress=None):
+    """Cycle the cell in blocks of ``checkpoint_every`` cycles.
+
+    After each block only the last state and that block's summary variables
+    are kept, both written to the job's checkpoint directory, so memory stays
+    flat and a restarted job carries on from the last finished block.
+    ``on_progress`` is called with a progress dict after every block.
+    """
+    config = parse_cycling(data)
+    battery_type = config["battery_type"]
+    names = config["summary_variables"]
+    total = config["cycles"]
+
+    parameter_set = data.get("parameter_set")
+    param = get_parameter_values(battery_type, config["selected_model"], parameter_set)
+    overrides = filter_params(param, data.get("params", {}))
+
+    path = checkpoint_dir(job_id)
+    path.mkdir(parents=True, exist_ok=True)
+    cycles_done, last_state, rows = load_checkpoint(path)
+    if cycles_done:
+        logger.info("Resuming cycling job %s after cycle %d", job_id, cycles_done)
+        with open(path / "summary.jsonl", "w") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+
+    termination = None
+    while cycles_done < total:
+        block = min(config["checkpoint_every"], total - cycles_done)
+        entry, inputs = get_simulation(
+            battery_type,
+            config["selected_model"],
+            param,
+            overrides,
+            data.get("var_pts"),
+            data.get("solver"),
+            experiment={**config["protocol"], "cycles": block},
+            model_options=config["options"],
+            parameter_set=parameter_set,
+        )
+        with entry.lock:
+            sim = entry.value
+            try:
+                # Only the last cycle of the block keeps its full solution
+                solution = sim.solve(
+                    starting_solution=last_state, inputs=inputs, save_at_cycles=block
+                )
+            finally:
+                sim._solution = None
+
+        summary = solution.summary_variables
+        missing = [name for name in names if name not in summary.all_variables]
+        if missing:
+            raise ValueError(f"Unknown summary variables: {', '.join(missing)}")
+
+        # A starting solution comes back as the first cycle
+        offset = 0 if last_state is None else 1
+        new = len(solution.cycles) - offset
+        new_rows = [
+            {
+                "Cycle number": cycles_done + i + 1,
+                **{name: to_json_value(summary[name][offset + i]) for name in names},
+            }
+            for i in range(new)
+        ]
+        termination = solution.termination
+        last_state = solution.last_state
+        del solution, summary
+
+        cycles_done += new
+        save_checkpoint(path, cycles_done, last_state, new_rows)
+        rows.extend(new_rows)
+        if on_progress is not None:
+            on_progress(
+                {
+                    "cycles_done": cycles_done,
+                    "cycles": total,
+                    "latest": new_rows[-1] if new_rows else None,
+                }
+            )
+
+        # A step that couldn't finish ends the experiment early
+        if new < block or capacity_reached(rows, config["min_capacity_percent"]):
+            break
+
+    shutil.rmtree(path, ignore_errors=True)
+    return {
+        "status": "success",
+        "summary": f"Completed {cycles_done} of {total} cycles",
+        "cycles": cycles_done,
+        "termination": termination,
+        "variables": {
+            name: [row[name] for row in rows] for name in ["Cycle number", *names]
+        },
+    }
+
+
+def capacity_reached(rows, min_capacity_percent):
+    # Stop once capacity fades below a share of the first cycle's
+    if min_capacity_percent is None or not rows:
+        return False
+    first = rows[0].get("Capacity [A.h]")
+    latest = rows[-1].get("Capacity [A.h]")
+    if first is None or latest is None:
+        return False
+    return latest < first * float(min_capacity_percent) / 100
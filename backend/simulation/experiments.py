@@ -0,0 +1,81 @@
+import hashlib
+
+import numpy as np
+import pybamm
+from django.conf import settings
+
+
+def load_drive_cycle(data, label="Drive cycle"):
+    """Parse a current profile into an (n, 2) array of time [s], current [A].
+
+    Accepts CSV text (an optional header row is skipped) or a list of
+    [time, current] rows. Positive current is a discharge, as in PyBaMM.
+    Other two-column time series reuse this with their own ``label``.
+    """
+    if isinstance(data, str):
+        lines = [line for line in data.splitlines() if line.strip()]
+        if lines:
+            try:
+                [float(v) for v in lines[0].split(",")]
+            except ValueError:
+                lines = lines[1:]  # Header row
+        data = [line.split(",") for line in lines]
+
+    try:
+        profile = np.array(data, dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError(f"{label} must be numeric rows of two columns")
+    if profile.ndim != 2 or profile.shape[1] != 2 or len(profile) < 2:
+        raise ValueError(f"{label} needs at least two rows of two columns")
+
+    max_rows = getattr(settings, "SIMULATION_DRIVE_CYCLE_MAX_ROWS", 100000)
+    if len(profile) > max_rows:
+        raise ValueError(f"{label} has {len(profile)} rows, the limit is {max_rows}")
+    if not np.all(np.isfinite(profile)):
+        raise ValueError(f"{label} contains non-finite values")
+    if np.any(np.diff(profile[:, 0]) <= 0):
+        raise ValueError(f"{label} time must be strictly increasing")
+    return profile
+
+
+def parse_experiment(spec):
+    """Turn an ``experiment`` request field into a ``pybamm.Experiment``.
+
+    ``spec`` is a list of step strings, or a dict with either ``steps`` or a
+    ``drive_cycle`` plus optional ``cycles`` and ``period``. Returns
+    (experiment, canonical) where canonical is a JSON-able description used
+    for cache keys, with drive cycles reduced to a hash of their data.
+    """
+    if isinstance(spec, list):
+        spec = {"steps": spec}
+    if not isinstance(spec, dict):
+        raise ValueError("Experiment must be a list of steps or an object")
+
+    period = spec.get("period")
+    if period is not None and not isinstance(period, str):
+        raise ValueError("Experiment period must be a string such as '10 seconds'")
+
+    cycles = int(spec.get("cycles", 1))
+    max_cycles = getattr(settings, "SIMULATION_EXPERIMENT_MAX_CYCLES", 100)
+    if not 1 <= cycles <= max_cycles:
+        raise ValueError(f"Experiment cycles must be between 1 and {max_cycles}")
+
+    if "drive_cycle" in spec:
+        profile = load_drive_cycle(spec["drive_cycle"])
+        steps = [pybamm.step.current(profile, period=period)]
+        canonical = {
+            "drive_cycle": hashlib.sha256(profile.tobytes()).hexdigest(),
+            "cycles": cycles,
+            "period": period,
+        }
+    else:
+        steps = spec.get("steps")
+        if not steps or not all(isinstance(step, str) for step in steps):
+            raise ValueError("Experiment steps must be a non-empty list of strings")
+        canonical = {"steps": list(steps), "cycles": cycles, "period": period}
+
+    try:
+        experiment = pybamm.Experiment([tuple(steps)] * cycles, period=period)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid experiment: {e}")
+    return experiment, canonical
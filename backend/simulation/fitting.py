@@ -0,0 +1,258 @@
+import time
+from functools import partial
+
+import numpy as np
+import pybamm
+from django.conf import settings
+from scipy.optimize import differential_evolution, least_squares
+
+from .experiments import load_drive_cycle
+from .parameter_sets import get_parameter_values, resolve_parameter_set
+from .pybamm_runner import (
+    downsample,
+    filter_params,
+    get_model_class,
+    is_geometric,
+    solve,
+)
+
+METHODS = ("least_squares", "differential_evolution")
+
+# Residual per point when a candidate fails to solve, pushes the optimizer away
+FAILED_RESIDUAL = 1.0
+
+
+def parse_free_parameters(param, free):
+    """Validate ``{name: {"bounds": [lo, hi], "initial": x, "log": bool}}``."""
+    if not isinstance(free, dict) or not free:
+        raise ValueError("Provide 'free', the parameters to fit with their bounds")
+    parsed = {}
+    for name, spec in free.items():
+        if name not in param.keys():
+            raise ValueError(f"Unknown parameter: {name}")
+        if is_geometric(name):
+            raise ValueError(f"{name} changes the mesh and can't be fitted")
+        try:
+            lo, hi = (float(v) for v in spec["bounds"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{name} needs numeric 'bounds': [lower, upper]")
+        log = bool(spec.get("log", False))
+        if not lo < hi or (log and lo <= 0):
+            raise ValueError(f"Invalid bounds for {name}")
+        initial = spec.get("initial")
+        if initial is None:
+            initial = np.sqrt(lo * hi) if log else (lo + hi) / 2
+        initial = float(initial)
+        if not lo <= initial <= hi:
+            raise ValueError(f"Initial value of {name} is outside its bounds")
+        parsed[name] = {"bounds": (lo, hi), "log": log, "initial": initial}
+    return parsed
+
+
+def parse_fitting(data):
+    """Validate a fitting request, returning its settings as a dict."""
+    battery_type = data.get("battery_type")
+    selected_model = data.get("selected_model")
+    get_model_class(battery_type, selected_model)
+    parameter_set = resolve_parameter_set(battery_type, selected_model, data.get("parameter_set"))
+    param = get_parameter_values(battery_type, selected_model, parameter_set)
+
+    if data.get("measurements") is None:
+        raise ValueError("Provide 'measurements', time [s] and voltage [V] rows")
+    measured = load_drive_cycle(data["measurements"], label="Measurements")
+
+    method = data.get("method", "least_squares")
+    if method not in METHODS:
+        raise ValueError(f"Unsupported method: {method}")
+    limit = getattr(settings, "SIMULATION_FITTING_MAX_EVALUATIONS", 200)
+    max_evaluations = int(data.get("max_evaluations", 50))
+    if not 1 <= max_evaluations <= limit:
+        raise ValueError(f"max_evaluations must be between 1 and {limit}")
+
+    free = parse_free_parameters(param, data.get("free"))
+    fixed = filter_params(param, data.get("params", {}))
+    return {
+        "battery_type": battery_type,
+        "selected_model": selected_model,
+        "parameter_set": parameter_set,
+        "params": {k: v for k, v in fixed.items() if k not in free},
+        "free": free,
+        "time": measured[:, 0],
+        "voltage": measured[:, 1],
+        "method": method,
+        "max_evaluations": max_evaluations,
+        "workers": int(data.get("workers", 1)),
+        "seed": data.get("seed"),
+        "var_pts": data.get("var_pts"),
+    }
+
+
+def to_parameters(x, free):
+    # The optimizer works on [0, 1] per parameter, log-scaled where asked
+    values = {}
+    for xi, (name, spec) in zip(x, free.items()):
+        lo, hi = spec["bounds"]
+        if spec["log"]:
+            values[name] = float(np.exp(np.log(lo) + xi * (np.log(hi) - np.log(lo))))
+        else:
+            values[name] = float(lo + xi * (hi - lo))
+    return values
+
+
+def to_unit(values, free):
+    x = []
+    for name, spec in free.items():
+        lo, hi = spec["bounds"]
+        if spec["log"]:
+            x.append((np.log(values[name]) - np.log(lo)) / (np.log(hi) - np.log(lo)))
+        else:
+            x.append((values[name] - lo) / (hi - lo))
+    return np.clip(x, 0, 1)
+
+
+def evaluate(x, config, jacobian=False):
+    """Residuals (model - measured voltage) for a candidate, and their
+    Jacobian with respect to ``x`` from solver sensitivities if asked."""
+    free = config["free"]
+    values = to_parameters(x, free)
+    t = config["time"]
+    try:
+        solution = solve(
+            config["battery_type"],
+            {**config["params"], **values},
+            config["selected_model"],
+            config["var_pts"],
+            t_eval=[0, float(t[-1])],
+            solver_options={"name": "idaklu"},
+            sensitivities=list(free) if jacobian else None,
+            parameter_set=config["parameter_set"],
+        )
+    except pybamm.SolverError:
+        residual = np.full(len(t), FAILED_RESIDUAL)
+        return (residual, np.zeros((len(t), len(free)))) if jacobian else residual
+
+    # Past a cut-off event the model holds its last voltage
+    t_model = solution["Time [s]"].entries
+    voltage = solution["Voltage [V]"]
+    residual = np.interp(t, t_model, voltage.entries) - config["voltage"]
+    if not jacobian:
+        return residual
+
+    columns = []
+    for name, spec in free.items():
+        dv_dp = np.asarray(voltage.sensitivities[name]).ravel()
+        lo, hi = spec["bounds"]
+        dp_dx = values[name] * np.log(hi / lo) if spec["log"] else hi - lo
+        columns.append(np.interp(t, t_model, dv_dp) * dp_dx)
+    return residual, np.column_stack(columns)
+
+
+def cost(x, config):
+    # Module level so pool workers can unpickle it
+    return 0.5 * float(np.sum(evaluate(x, config) ** 2))
+
+
+def run_fitting(data, on_progress=None):
+    """Fit the free parameters to the measured voltage.
+
+    ``least_squares`` runs a bounded trust-region fit with the Jacobian taken
+    from IDAKLU forward sensitivities, so every iteration is one solve.
+    ``differential_evolution`` searches globally, evaluating each generation
+    across the batch process pool when ``workers`` > 1. ``on_progress`` gets
+    the best parameters found so far whenever they improve.
+    """
+    started = time.perf_counter()
+    config = parse_fitting(data)
+    free = config["free"]
+    n = len(config["time"])
+    x0 = to_unit({name: spec["initial"] for name, spec in free.items()}, free)
+    best = {"cost": np.inf, "evaluations": 0}
+
+    def report(x, value):
+        if value >= best["cost"]:
+            return
+        best["cost"] = value
+        if on_progress is not None:
+            on_progress(
+                {
+                    "evaluations": best["evaluations"],
+                    "best_rmse": float(np.sqrt(2 * value / n)),
+                    "best_parameters": to_parameters(x, free),
+                }
+            )
+
+    if config["method"] == "least_squares":
+        last = {}
+
+        def residuals(x):
+            best["evaluations"] += 1
+            r, jac = evaluate(x, config, jacobian=True)
+            last["x"], last["jac"] = x.copy(), jac
+            report(x, 0.5 * float(np.sum(r**2)))
+            return r
+
+        def jacobian(x):
+            # Computed alongside the residuals of the same point
+            if "x" in last and np.array_equal(last["x"], x):
+                return last["jac"]
+            return evaluate(x, config, jacobian=True)[1]
+
+        fit = least_squares(
+            residuals,
+            x0,
+            jac=jacobian,
+            bounds=(0, 1),
+            max_nfev=config["max_evaluations"],
+        )
+        evaluations = int(fit.nfev)
+    else:
+        from .batch import get_pool
+
+        popsize = int(data.get("popsize", 8))
+        workers = max(
+            1,
+            min(config["workers"], getattr(settings, "SIMULATION_BATCH_MAX_PROCESSES", 4)),
+        )
+        generation_size = popsize * len(free)
+        best["evaluations"] = generation_size  # Initial population
+
+        def callback(intermediate_result):
+            best["evaluations"] += generation_size
+            report(intermediate_result.x, intermediate_result.fun)
+
+        fit = differential_evolution(
+            partial(cost, config=config),
+            bounds=[(0, 1)] * len(free),
+            x0=x0,
+            popsize=popsize,
+            maxiter=max(1, config["max_evaluations"] // generation_size - 1),
+            seed=config["seed"],
+            polish=False,
+            callback=callback,
+            workers=get_pool().map if workers > 1 else 1,
+            updating="deferred" if workers > 1 else "immediate",
+        )
+        evaluations = int(fit.nfev)
+
+    fitted = config["voltage"] + evaluate(fit.x, config)
+    curves = downsample(
+        {
+            "Time [s]": config["time"],
+            "Measured voltage [V]": config["voltage"],
+            "Fitted voltage [V]": fitted,
+        },
+        500,
+    )
+    rmse = float(np.sqrt(np.mean((fitted - config["voltage"]) ** 2)))
+    return {
+        "status": "success",
+        "summary": f"Fitted {len(free)} parameters, RMSE {rmse * 1000:.1f} mV",
+        "method": config["method"],
+        "parameters": to_parameters(fit.x, free),
+        "rmse": rmse,
+        "evaluations": evaluations,
+        "converged": bool(fit.success),
+        "message": str(fit.message),
+        "series": {name: values.tolist() for name, values in curves.items()},
+        "timings": {"total": time.perf_counter() - started},
+    }
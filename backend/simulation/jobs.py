@@ -0,0 +1,110 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def init_worker():
+    # Pool workers are spawned, so each one needs its own Django setup.
+    # This also runs SimulationConfig.ready(), warming up the worker.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, "SIMULATION_JOB_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+            )
+        return _executor
+
+
+def execute_job(job_id):
+    """Run a pending job and store its outcome. Safe to call more than once."""
+    from .admission import settle_job
+    from .models import SimulationJob
+    from .result_cache import run_cached
+    from .storage import record_run, should_persist
+
+    # Claim the job so two workers never run it twice
+    claimed = SimulationJob.objects.filter(pk=job_id, status="pending").update(
+        status="running", started_at=timezone.now()
+    )
+    if not claimed:
+        return
+
+    job = SimulationJob.objects.get(pk=job_id)
+
+    def report(progress):
+        SimulationJob.objects.filter(pk=job_id).update(progress=progress)
+
+    started = time.perf_counter()
+    # Pool workers run one job at a time, so process time is this job's
+    cpu_started = time.process_time()
+    try:
+        if job.kind == "cycling":
+            from .cycling import run_cycling
+
+            result = run_cycling(job_id, job.request, on_progress=report)
+        elif job.kind == "fitting":
+            from .fitting import run_fitting
+
+            result = run_fitting(job.request, on_progress=report)
+        else:
+            bypass = bool(job.request.get("nocache"))
+            persist = should_persist(job.request)
+            result, _, key = run_cached(job.request, bypass=bypass, persist=persist)
+            if persist:
+                run = record_run(job.user, job.request, key, result)
+                result = {**result, "run_id": run.id}
+        job.results = result
+        job.status = "completed"
+    except Exception as e:
+        logger.exception("Simulation job %s failed", job_id)
+        job.status = "failed"
+        job.error_message = str(e)
+    job.completed_at = timezone.now()
+    job.save(update_fields=["status", "results", "error_message", "completed_at"])
+
+    try:
+        settle_job(
+            job,
+            200 if job.status == "completed" else 500,
+            time.perf_counter() - started,
+            time.process_time() - cpu_started,
+        )
+    except Exception:
+        logger.exception("Couldn't record usage of job %s", job_id)
+
+
+def submit_job(job):
+    backend = getattr(settings, "SIMULATION_JOB_BACKEND", "local")
+    job_id = str(job.id)
+
+    if backend == "local":
+        transaction.on_commit(lambda: get_executor().submit(execute_job, job_id))
+    elif backend == "celery":
+        from .tasks import run_simulation_job
+
+        transaction.on_commit(lambda: run_simulation_job.delay(job_id))
+    elif backend == "database":
+        # Picked up by `manage.py simulation_worker`
+        pass
+    else:
+        raise ValueError(f"Unknown simulation job backend: {backend}")
@@ -0,0 +1,119 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulation.benchmark import (
+    benchmark_case,
+    combinations,
+    compare,
+    environment,
+    load_results,
+    load_test,
+)
+
+
+def number_list(value):
+    try:
+        return [float(v) for v in value.split(",")]
+    except ValueError:
+        raise CommandError(f"Expected comma separated numbers, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Time run_simulation cold and warm for every chemistry and model across "
+        "durations and mesh sizes, plus /api/simulate/ latency under concurrent load"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--battery-type", action="append", default=[])
+        parser.add_argument("--model", action="append", default=[])
+        parser.add_argument("--durations", default="600,3600", help="Seconds, comma separated")
+        parser.add_argument(
+            "--mesh", default="1,2", help="Multiples of each model's default mesh points"
+        )
+        parser.add_argument("--repeats", type=int, default=3)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--requests", type=int, default=20)
+        parser.add_argument("--load-model", default="lithium-ion:SPM")
+        parser.add_argument("--skip-load", action="store_true")
+        parser.add_argument("--output", help="Write results as JSON to this file")
+        parser.add_argument("--compare", metavar="BASELINE", help="Results file to compare with")
+        parser.add_argument("--threshold", type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        cases = []
+        for battery_type, selected_model in combinations(
+            options["battery_type"], options["model"]
+        ):
+            for duration in number_list(options["durations"]):
+                for scale in number_list(options["mesh"]):
+                    case = benchmark_case(
+                        battery_type, selected_model, duration, scale, options["repeats"]
+                    )
+                    cases.append(case)
+                    self.report_case(case)
+        if not cases:
+            raise CommandError("No chemistry/model matches the filters")
+
+        results = {"environment": environment(), "cases": cases}
+        if not options["skip_load"]:
+            battery_type, selected_model = options["load_model"].split(":", 1)
+            try:
+                results["load"] = load_test(
+                    {"battery_type": battery_type, "selected_model": selected_model},
+                    concurrency=options["concurrency"],
+                    requests=options["requests"],
+                )
+            except RuntimeError as e:
+                raise CommandError(f"Load test failed: {e}")
+            latency = results["load"]["latency"]
+            self.stdout.write(
+                f"Load {options['load_model']} x{options['concurrency']}: "
+                f"{results['load']['throughput']:.1f} req/s, p50 {latency['p50'] * 1000:.0f} ms, "
+                f"p95 {latency['p95'] * 1000:.0f} ms, {results['load']['responses']}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if results.get("load", {}).get("failures"):
+            # Error responses are fast, their throughput means nothing
+            raise CommandError(
+                f"{results['load']['failures']} of {options['requests']} load test "
+                f"requests failed: {results['load']['responses']}"
+            )
+
+        if options["compare"]:
+            self.compare(load_results(options["compare"]), results, options["threshold"])
+
+    def report_case(self, case):
+        label = (
+            f"{case['battery_type']} {case['selected_model']} "
+            f"{case['duration']:g}s mesh x{case['mesh_scale']:g}"
+        )
+        if "error" in case:
+            self.stdout.write(self.style.WARNING(f"{label}: {case['error']}"))
+            return
+        self.stdout.write(
+            f"{label}: cold {case['cold']:.3f}s, warm {case['warm']['median']:.3f}s "
+            f"(solve {case['warm_timings']['solve']:.3f}s)"
+        )
+
+    def compare(self, baseline, results, threshold):
+        rows = compare(baseline, results, threshold)
+        for row in rows:
+            line = (
+                f"{' '.join(str(v) for v in row['case'])} {row['metric']}: "
+                f"{row['before']:.3f}s -> {row['after']:.3f}s ({row['ratio']:.2f}x)"
+            )
+            self.stdout.write(self.style.ERROR(line) if row["regression"] else line)
+        regressions = sum(row["regression"] for row in rows)
+        if regressions:
+            raise CommandError(
+                f"{regressions} timings slower than {1 + threshold:.2f}x the baseline "
+                f"({baseline['environment'].get('commit')})"
+            )
+        self.stdout.write(self.style.SUCCESS(f"No regressions in {len(rows)} timings"))
@@ -0,0 +1,125 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+def chunk(model, delta, finish_reason=None):
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+class Server(ThreadingHTTPServer):
+    # The default backlog of 5 makes concurrent load tests stall on connect
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def make_handler(latency, token_delay, reply):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            model = body.get("model", "mock")
+            question = body["messages"][-1]["content"]
+            words = (reply or f"You asked: {question}").split(" ")
+            time.sleep(latency)
+
+            if not body.get("stream"):
+                text = " ".join(words)
+                self.send_json(
+                    {
+                        "id": "chatcmpl-mock",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": text},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": len(question.split()),
+                            "completion_tokens": len(words),
+                            "total_tokens": len(question.split()) + len(words),
+                        },
+                    }
+                )
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.write_event(chunk(model, {"role": "assistant", "content": ""}))
+            for i, word in enumerate(words):
+                time.sleep(token_delay)
+                self.write_event(chunk(model, {"content": word if i == 0 else " " + word}))
+            self.write_event(chunk(model, {}, "stop"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def send_json(self, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def write_event(self, payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a fake OpenAI chat completions API that echoes the question word by "
+        "word, for running the chatbot without a key. Point OPENAI_BASE_URL at "
+        "http://<host>:<port>/v1"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument(
+            "--latency", type=float, default=0.5, help="Seconds before the first token"
+        )
+        parser.add_argument(
+            "--token-delay", type=float, default=0.05, help="Seconds between tokens"
+        )
+        parser.add_argument("--reply", default="", help="Fixed reply instead of the echo")
+
+    def handle(self, *args, **options):
+        server = Server(
+            (options["host"], options["port"]),
+            make_handler(options["latency"], options["token_delay"], options["reply"]),
+        )
+        self.stdout.write(
+            f"Mock LLM on http://{options['host']}:{options['port']}/v1, Ctrl-C to stop"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
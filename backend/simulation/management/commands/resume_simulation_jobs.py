@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from simulation.jobs import submit_job
+from simulation.models import SimulationJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Requeue jobs left 'running' by a crash or restart. Cycling jobs carry "
+        "on from their last checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=[k for k, _ in SimulationJob.KIND_CHOICES])
+
+    def handle(self, *args, **options):
+        jobs = SimulationJob.objects.filter(status="running")
+        if options["kind"]:
+            jobs = jobs.filter(kind=options["kind"])
+
+        for job in jobs:
+            SimulationJob.objects.filter(pk=job.pk, status="running").update(
+                status="pending", started_at=None
+            )
+            submit_job(job)
+            self.stdout.write(f"Requeued {job.kind} job {job.pk}")
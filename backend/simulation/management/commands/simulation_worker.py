@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from simulation.jobs import execute_job, get_executor
+from simulation.models import SimulationJob
+
+
+class Command(BaseCommand):
+    help = "Run queued simulation jobs (SIMULATION_JOB_BACKEND = 'database')"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        executor = get_executor()
+        running = {}
+        self.stdout.write("Waiting for simulation jobs...")
+
+        while True:
+            for job_id, future in list(running.items()):
+                if future.done():
+                    del running[job_id]
+
+            pending = (
+                SimulationJob.objects.filter(status="pending")
+                .exclude(pk__in=running.keys())
+                .order_by("created_at")
+                .values_list("pk", flat=True)
+            )
+            for job_id in pending:
+                running[job_id] = executor.submit(execute_job, str(job_id))
+
+            time.sleep(options["poll_interval"])
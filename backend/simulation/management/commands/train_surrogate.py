@@ -0,0 +1,111 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from simulation.surrogate import (
+    get_surrogate,
+    normalize_curves,
+    sample_runs,
+    surrogate_path,
+    train_surrogate,
+)
+
+
+def parse_range(value):
+    # "Name [unit]=low:high"
+    try:
+        name, bounds = value.rsplit("=", 1)
+        low, high = (float(v) for v in bounds.split(":"))
+    except ValueError:
+        raise CommandError(f"Expected name=low:high, got {value!r}")
+    return name, (low, high)
+
+
+class Command(BaseCommand):
+    help = "Train the preview surrogate for a battery type and model from seeded PyBaMM runs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("battery_type")
+        parser.add_argument("selected_model")
+        parser.add_argument(
+            "--param",
+            action="append",
+            default=[],
+            help="Input range as 'name=low:high', repeatable. Defaults per chemistry.",
+        )
+        parser.add_argument("--samples", type=int, default=200)
+        parser.add_argument("--points", type=int, default=100)
+        parser.add_argument("--duration", type=float, default=3600)
+        parser.add_argument("--degree", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument(
+            "--evaluate",
+            type=int,
+            default=0,
+            metavar="N",
+            help="Only check the saved surrogate against N fresh seeded runs",
+        )
+
+    def handle(self, *args, **options):
+        battery_type = options["battery_type"]
+        selected_model = options["selected_model"]
+        ranges = dict(parse_range(value) for value in options["param"]) or None
+
+        if options["evaluate"]:
+            self.evaluate(battery_type, selected_model, options)
+            return
+
+        try:
+            surrogate = train_surrogate(
+                battery_type,
+                selected_model,
+                ranges=ranges,
+                samples=options["samples"],
+                duration=options["duration"],
+                points=options["points"],
+                degree=options["degree"],
+                seed=options["seed"],
+                processes=options["processes"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        validation = surrogate.meta["validation"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Saved {surrogate_path(battery_type, selected_model)}: "
+                f"{surrogate.meta['samples']} runs, {validation['components']} components, "
+                f"validation RMSE {validation['rmse'] * 1000:.2f} mV "
+                f"(worst {validation['max_rmse'] * 1000:.2f} mV) "
+                f"in {validation['training_seconds']:.1f}s"
+            )
+        )
+
+    def evaluate(self, battery_type, selected_model, options):
+        surrogate = get_surrogate(battery_type, selected_model)
+        if surrogate is None:
+            raise CommandError("No surrogate trained for this battery type and model")
+        ranges = {
+            name: (low, high)
+            for name, low, high in zip(surrogate.names, surrogate.lows, surrogate.highs)
+        }
+        # A different seed from training so the runs are unseen
+        points = len(surrogate.fractions)
+        _, _, _, inputs, time_grid, voltage = sample_runs(
+            battery_type,
+            selected_model,
+            ranges,
+            options["evaluate"],
+            surrogate.meta["duration"],
+            10 * points,
+            options["seed"] + 1,
+            options["processes"],
+        )
+        voltage, t_end, keep = normalize_curves(time_grid, voltage, points)
+        curves, predicted_end = surrogate.predict_scaled(surrogate.scale(inputs[keep]))
+        errors = np.sqrt(np.mean((curves - voltage) ** 2, axis=1))
+        self.stdout.write(
+            f"{len(errors)} runs: RMSE {np.sqrt(np.mean(errors**2)) * 1000:.2f} mV, "
+            f"worst {errors.max() * 1000:.2f} mV, "
+            f"end time error {np.abs(predicted_end - t_end).mean():.1f}s"
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from simulation.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = "Build and solve the SIMULATION_WARMUP_MODELS once and report the time taken"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="battery_type:model pairs, defaults to SIMULATION_WARMUP_MODELS",
+        )
+
+    def handle(self, *args, **options):
+        models = [tuple(pair.split(":", 1)) for pair in options["models"]] or None
+        elapsed = warm_up(models)
+        self.stdout.write(self.style.SUCCESS(f"Warm-up finished in {elapsed:.2f}s"))
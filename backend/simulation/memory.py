@@ -0,0 +1,47 @@
+import os
+import threading
+
+
+def current_rss(pid="self"):
+    # Resident set size of a process in bytes, 0 where /proc is unavailable
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakMemory:
+    """Track peak RSS while a block runs, sampling on a background thread.
+
+    RSS is per process, so requests running side by side in one worker see
+    each other's allocations.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = 0
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def report(self):
+        return {
+            "start_rss_bytes": self.start,
+            "peak_rss_bytes": self.peak,
+            "peak_delta_bytes": self.peak - self.start,
+        }
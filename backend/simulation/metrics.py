@@ -0,0 +1,201 @@
+import threading
+
+from .memory import current_rss
+
+# Seconds, from a cached SPM solve up to a slow DFN build
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MEMORY_BUCKETS = tuple(2**n * 1024 * 1024 for n in range(0, 13, 2))  # 1 MB to 4 GB
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts, sum, count)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total, n = self._values.get(labels) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[labels] = (counts, total + value, n + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for labels, (counts, total, n) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(
+                        f"{self.name}_bucket{format_labels(names, labels + (f'{bound:g}',))} {count}"
+                    )
+                lines.append(f"{self.name}_bucket{format_labels(names, labels + ('+Inf',))} {n}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {n}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "simulation_stage_seconds",
+    "Time spent in each stage of a simulation",
+    ("battery_type", "model", "stage"),
+)
+peak_memory_bytes = Histogram(
+    "simulation_peak_memory_bytes",
+    "Peak RSS growth while a simulation ran",
+    ("battery_type", "model"),
+    buckets=MEMORY_BUCKETS,
+)
+simulations = Counter(
+    "simulation_runs_total",
+    "Simulations solved, not counting result cache hits",
+    ("battery_type", "model"),
+)
+requests = Counter(
+    "simulation_requests_total",
+    "Simulate requests by result cache status (hit, miss or bypass)",
+    ("battery_type", "model", "cache"),
+)
+rejections = Counter(
+    "simulation_rejections_total",
+    "Requests turned away, by reason (busy or quota with 429, cost with 400)",
+    ("reason",),
+)
+aborted = Counter(
+    "simulation_aborted_total",
+    "Supervised runs killed, by cause (timeout, memory_limit or crashed)",
+    ("code",),
+)
+failures = Counter(
+    "simulation_failures_total",
+    "Simulate requests that raised an error",
+    ("battery_type", "model"),
+)
+
+
+def request_labels(data):
+    # Unknown names from the request would each start a new time series
+    from .pybamm_runner import chemistries
+
+    battery_type = data.get("battery_type")
+    selected_model = data.get("selected_model")
+    if battery_type not in chemistries or selected_model not in chemistries[battery_type][0]:
+        return ("other", "other")
+    return (battery_type, selected_model)
+
+
+def record_simulation(battery_type, selected_model, timings, memory=None):
+    """Record the stage timings (seconds) and memory report of one solve."""
+    simulations.inc(battery_type, selected_model)
+    for stage, seconds in timings.items():
+        stage_seconds.observe(seconds, battery_type, selected_model, stage)
+    if memory:
+        peak_memory_bytes.observe(memory["peak_delta_bytes"], battery_type, selected_model)
+
+
+def record_stage(battery_type, selected_model, stage, seconds):
+    stage_seconds.observe(seconds, battery_type, selected_model, stage)
+
+
+def format_timing(timings):
+    # Server-Timing syntax in milliseconds: "solve;dur=12.3, postprocess;dur=1.0"
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def sample(name, documentation, value, kind="gauge"):
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+def render_metrics():
+    """All metrics of this process in the Prometheus text format."""
+    from .admission import scheduler
+    from .pybamm_runner import model_cache
+    from .result_cache import result_cache
+    from .supervisor import get_supervised_pool, isolated
+
+    lines = []
+    for metric in (
+        stage_seconds,
+        peak_memory_bytes,
+        simulations,
+        requests,
+        rejections,
+        aborted,
+        failures,
+    ):
+        lines.extend(metric.render())
+
+    models = model_cache.stats()
+    if isolated():
+        # Runs build their models in the supervised workers
+        workers = get_supervised_pool().cache_stats()
+        models = {name: value + workers.get(name, 0) for name, value in models.items()}
+    results = result_cache.stats()
+    lines += sample(
+        "simulation_model_cache_hits_total", "Built model cache hits", models["hits"], "counter"
+    )
+    lines += sample(
+        "simulation_model_cache_misses_total",
+        "Built model cache misses, each one a model build",
+        models["misses"],
+        "counter",
+    )
+    lines += sample(
+        "simulation_model_cache_evictions_total",
+        "Built models evicted from the cache",
+        models["evictions"],
+        "counter",
+    )
+    lines += sample("simulation_model_cache_entries", "Built models cached", models["entries"])
+    lines += sample(
+        "simulation_model_cache_bytes", "Estimated memory of cached models", models["bytes"]
+    )
+    lines += sample(
+        "simulation_result_cache_hits_total", "Result cache hits", results["hits"], "counter"
+    )
+    lines += sample(
+        "simulation_result_cache_misses_total", "Result cache misses", results["misses"], "counter"
+    )
+    lines += sample(
+        "simulation_result_cache_entries", "Results held in memory", results["entries"]
+    )
+    lines += sample(
+        "simulation_scheduler_running", "Simulations holding a slot", scheduler.running()
+    )
+    lines += sample(
+        "simulation_scheduler_queued", "Simulations waiting for a slot", scheduler.queued()
+    )
+    lines += sample("process_resident_memory_bytes", "Resident memory", current_rss())
+    return "\n".join(lines) + "\n"
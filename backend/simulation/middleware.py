@@ -0,0 +1,154 @@
+import gzip
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, responses fall back to gzip
+    brotli = None
+
+ACCEPTS_BR = re.compile(r"\bbr\b")
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+# Already compressed, another pass only costs time
+INCOMPRESSIBLE_TYPES = ("image/", "video/", "application/zip", "application/gzip")
+
+
+class SimulationTimingMiddleware:
+    """Time response serialization for simulate requests and, with
+    SIMULATION_TIMING_HEADER on, report the stages in ``X-Sim-Timing``.
+
+    Views opt in by setting ``response.sim_timings`` (seconds per stage) and
+    ``response.sim_labels`` (battery type, model). Keep this last in
+    MIDDLEWARE so it sees the response right after it is rendered.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(await self.get_response(request))
+
+    def process_response(self, response):
+        timings = getattr(response, "sim_timings", None)
+        if timings is None:
+            return response
+        # Rendering happens after the view returns, start from the view's end
+        serialize = time.perf_counter() - response.sim_finished
+        metrics.record_stage(*response.sim_labels, "serialize", serialize)
+        if getattr(settings, "SIMULATION_TIMING_HEADER", False):
+            response["X-Sim-Timing"] = metrics.format_timing({**timings, "serialize": serialize})
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that also runs natively under ASGI. A sync-only middleware
+    makes Django run the rest of the stack in its single sync thread, which
+    would serialize the async chat view."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class CompressionMiddleware:
+    """Brotli or gzip for responses of at least SIMULATION_COMPRESS_MIN_BYTES,
+    whichever the client accepts, preferring Brotli.
+
+    Small responses aren't worth the CPU and streams (the SSE endpoints)
+    have to reach the client as they are written, so both pass through.
+    Keep this near the top of MIDDLEWARE so it sees the final body.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def choose_encoding(self, request):
+        accepted = request.headers.get("Accept-Encoding", "")
+        if brotli is not None and ACCEPTS_BR.search(accepted):
+            return "br"
+        if ACCEPTS_GZIP.search(accepted):
+            return "gzip"
+        return None
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < getattr(settings, "SIMULATION_COMPRESS_MIN_BYTES", 1024)
+            or response.get("Content-Type", "").startswith(INCOMPRESSIBLE_TYPES)
+        ):
+            return response
+        # Caches have to keep the variants apart even when this one isn't compressed
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = self.choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if encoding == "br":
+            compressed = brotli.compress(
+                response.content, quality=getattr(settings, "SIMULATION_BROTLI_QUALITY", 4)
+            )
+        else:
+            compressed = gzip.compress(
+                response.content,
+                compresslevel=getattr(settings, "SIMULATION_GZIP_LEVEL", 6),
+                mtime=0,
+            )
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # The bytes differ from the uncompressed variant, see RFC 9110 8.8.1
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0003_simulationjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimulationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("battery_type", models.CharField(max_length=50)),
+                ("model_name", models.CharField(max_length=50)),
+                ("parameters", models.JSONField(default=dict)),
+                ("duration", models.FloatField()),
+                ("termination", models.CharField(blank=True, max_length=200)),
+                ("data_path", models.CharField(max_length=255)),
+                ("variables", models.JSONField(default=list)),
+                ("n_points", models.IntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "simulation_runs",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
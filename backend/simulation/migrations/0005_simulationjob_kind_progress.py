@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0004_simulationrun"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationjob",
+            name="kind",
+            field=models.CharField(
+                choices=[("simulate", "Simulate"), ("cycling", "Cycling")],
+                default="simulate",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="simulationjob",
+            name="progress",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0005_simulationjob_kind_progress"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="simulationjob",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("simulate", "Simulate"),
+                    ("cycling", "Cycling"),
+                    ("fitting", "Fitting"),
+                ],
+                default="simulate",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0006_simulationjob_fitting_kind"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="APIUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("endpoint", models.CharField(max_length=100)),
+                ("method", models.CharField(max_length=10)),
+                ("status_code", models.IntegerField()),
+                ("execution_time", models.FloatField()),
+                ("cpu_seconds", models.FloatField(default=0)),
+                ("estimated_cost", models.FloatField(default=0)),
+                ("timestamp", models.DateTimeField(auto_now_add=True)),
+                ("user_agent", models.CharField(blank=True, max_length=200)),
+                ("ip_address", models.GenericIPAddressField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "api_usage",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "timestamp"],
+                        name="api_usage_user_id_8a1df0_idx",
+                    ),
+                    models.Index(
+                        fields=["endpoint", "timestamp"],
+                        name="api_usage_endpoin_757c88_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
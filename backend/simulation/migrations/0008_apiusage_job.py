@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0007_apiusage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apiusage",
+            name="job",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="usage",
+                to="simulation.simulationjob",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:11
+
+import simulation.renderers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulation", "0008_apiusage_job"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="simulationjob",
+            name="results",
+            field=models.JSONField(
+                blank=True, encoder=simulation.renderers.SeriesEncoder, null=True
+            ),
+        ),
+    ]
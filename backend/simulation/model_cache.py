@@ -0,0 +1,78 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from .memory import current_rss
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    def __init__(self, value, size):
+        self.value = value
+        self.size = size
+        # A built simulation keeps solver state, so only one solve at a time
+        self.lock = threading.Lock()
+
+
+class ModelCache:
+    """Process-wide LRU cache of built and discretised simulations."""
+
+    def __init__(self, max_entries=8, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key, builder):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, True
+            self.misses += 1
+
+        # Build outside the lock so a slow DFN build doesn't block hits on other keys
+        rss_before = current_rss()
+        value = builder()
+        entry = CacheEntry(value, max(current_rss() - rss_before, 0))
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                # Another thread built the same key first, keep theirs
+                self._entries.move_to_end(key)
+                return existing, False
+            self._entries[key] = entry
+            self._evict()
+        logger.debug("Built model for %s (%d bytes)", key, entry.size)
+        return entry, False
+
+    def _evict(self):
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.total_bytes() > self.max_bytes
+        ):
+            key, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            logger.info("Evicted cached model %s", key)
+
+    def total_bytes(self):
+        return sum(entry.size for entry in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -3,6 +3,9 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 import random
 import string
+import uuid
+
+from .renderers import SeriesEncoder
 
 class PasswordResetOTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -24,3 +27,83 @@ class PasswordResetOTP(models.Model):
             start = 10**(5)
             end = (10**6) - 1
             return str(random.randint(start, end))
+
+
+class SimulationJob(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+        ("cancelled", "Cancelled"),
+    ]
+    KIND_CHOICES = [
+        ("simulate", "Simulate"),
+        ("cycling", "Cycling"),
+        ("fitting", "Fitting"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default="simulate")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    request = models.JSONField(default=dict)
+    # Updated while long jobs run, e.g. cycles completed so far
+    progress = models.JSONField(blank=True, null=True)
+    results = models.JSONField(blank=True, null=True, encoder=SeriesEncoder)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "simulation_jobs"
+        ordering = ["-created_at"]
+
+    def is_finished(self):
+        return self.status in ("completed", "failed", "cancelled")
+
+
+class SimulationRun(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    battery_type = models.CharField(max_length=50)
+    model_name = models.CharField(max_length=50)
+    parameters = models.JSONField(default=dict)
+    duration = models.FloatField()
+    termination = models.CharField(max_length=200, blank=True)
+    # Solution arrays live in a compressed .npz under SIMULATION_RESULTS_DIR
+    data_path = models.CharField(max_length=255)
+    variables = models.JSONField(default=list)
+    n_points = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "simulation_runs"
+        ordering = ["-created_at"]
+
+
+class APIUsage(models.Model):
+    """One metered request, the ledger behind per-user CPU-second quotas."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    endpoint = models.CharField(max_length=100)
+    method = models.CharField(max_length=10)
+    status_code = models.IntegerField()
+    execution_time = models.FloatField()
+    # CPU time actually used, and what admission control estimated beforehand
+    cpu_seconds = models.FloatField(default=0)
+    estimated_cost = models.FloatField(default=0)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    user_agent = models.CharField(max_length=200, blank=True)
+    ip_address = models.GenericIPAddressField(blank=True, null=True)
+    # Set for jobs, whose estimate is reserved at submit and settled when they end
+    job = models.OneToOneField(
+        SimulationJob, on_delete=models.SET_NULL, blank=True, null=True, related_name="usage"
+    )
+
+    class Meta:
+        db_table = "api_usage"
+        indexes = [
+            models.Index(fields=["user", "timestamp"]),
+            models.Index(fields=["endpoint", "timestamp"]),
+        ]
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import numbers
+import re
+from functools import lru_cache
+
+import pybamm
+
+# battery_type -> parameter sets offered, the first is the default
+PARAMETER_SETS = {
+    "lithium-ion": (
+        "Chen2020",
+        "Marquis2019",
+        "Ecker2015",
+        "OKane2022",
+        "Prada2013",
+        "Ai2020",
+        "ORegan2022",
+        "NCA_Kim2011",
+        "Ramadass2004",
+    ),
+    "lead-acid": ("Sulzer2019",),
+    "sodium-ion": ("Chayambuka2022",),
+}
+# Models that only run with sets written for them
+MODEL_PARAMETER_SETS = {
+    ("lithium-ion", "MSMR"): ("MSMR_Example",),
+}
+# Models that need particle-size distributions on top of the set
+SIZE_DISTRIBUTION_MODELS = {("lithium-ion", "MPM")}
+
+# Physical bounds as (minimum, maximum, whether the minimum is allowed).
+# Names are matched first, by substring, then units; the rest only have to
+# be finite numbers.
+NAME_BOUNDS = (
+    ("porosity", (0.0, 1.0, False)),
+    ("volume fraction", (0.0, 1.0, True)),
+    ("transference number", (0.0, 1.0, True)),
+    ("electrode thickness [m]", (0.0, None, False)),
+    ("Separator thickness [m]", (0.0, None, False)),
+    ("minimum particle radius [m]", (0.0, None, True)),
+    ("particle radius [m]", (0.0, None, False)),
+    ("Electrode height [m]", (0.0, None, False)),
+    ("Electrode width [m]", (0.0, None, False)),
+    ("Maximum concentration", (0.0, None, False)),
+    ("Number of electrodes connected in parallel", (1.0, None, True)),
+    ("Number of cells connected in series", (1.0, None, True)),
+    ("Bruggeman coefficient", (0.0, None, True)),
+)
+UNIT_BOUNDS = {
+    "K": (0.0, None, False),
+    "A.h": (0.0, None, False),
+    "S.m-1": (0.0, None, False),
+    "m2.s-1": (0.0, None, False),
+    "kg.m-3": (0.0, None, False),
+    "J.kg-1.K-1": (0.0, None, False),
+    "W.m-1.K-1": (0.0, None, False),
+    "m": (0.0, None, True),
+    "mol.m-3": (0.0, None, True),
+    "A.m-2": (0.0, None, True),
+    "F.m-2": (0.0, None, True),
+    "W.m-2.K-1": (0.0, None, True),
+    "Ohm": (0.0, None, True),
+    "Ohm.m": (0.0, None, True),
+    "m2": (0.0, None, True),
+    "m3": (0.0, None, True),
+    "Pa": (0.0, None, True),
+    "s-1": (0.0, None, True),
+    "J.mol-1": (0.0, None, True),
+    "kg.mol-1": (0.0, None, True),
+}
+
+
+def available_sets(battery_type, selected_model=None):
+    if battery_type not in PARAMETER_SETS:
+        raise ValueError(f"Unsupported battery type: {battery_type}")
+    return MODEL_PARAMETER_SETS.get((battery_type, selected_model), PARAMETER_SETS[battery_type])
+
+
+def resolve_parameter_set(battery_type, selected_model=None, name=None):
+    """The set a request runs with: ``name`` if given and offered for the
+    model, otherwise the model's default."""
+    offered = available_sets(battery_type, selected_model)
+    if name is None:
+        return offered[0]
+    if name not in offered:
+        raise ValueError(
+            f"Unsupported parameter set for {battery_type} {selected_model}: {name}"
+        )
+    return name
+
+
+@lru_cache(maxsize=None)
+def load_parameter_values(name, size_distribution=False):
+    # Parsed once per process; every caller shares this object
+    param = pybamm.ParameterValues(name)
+    if size_distribution:
+        param = pybamm.get_size_distribution_parameters(param)
+    return param
+
+
+def get_parameter_values(battery_type, selected_model=None, name=None):
+    """Parameter values for a request, shared between requests.
+
+    Treat the result as read-only and ``copy()`` it before changing any
+    value, as get_simulation does when it builds a model.
+    """
+    return load_parameter_values(
+        resolve_parameter_set(battery_type, selected_model, name),
+        (battery_type, selected_model) in SIZE_DISTRIBUTION_MODELS,
+    )
+
+
+@lru_cache(maxsize=None)
+def _keys(name, size_distribution):
+    return frozenset(load_parameter_values(name, size_distribution).keys())
+
+
+def valid_keys(battery_type, selected_model=None, name=None):
+    """Parameter names a request may override."""
+    return _keys(
+        resolve_parameter_set(battery_type, selected_model, name),
+        (battery_type, selected_model) in SIZE_DISTRIBUTION_MODELS,
+    )
+
+
+def unit_of(name):
+    match = re.search(r"\[([^\]]+)\]$", name)
+    return match.group(1) if match else ""
+
+
+def parameter_bounds(name):
+    for pattern, bounds in NAME_BOUNDS:
+        if pattern in name:
+            return bounds
+    return UNIT_BOUNDS.get(unit_of(name), (None, None, True))
+
+
+@lru_cache(maxsize=None)
+def _schema(name, size_distribution):
+    param = load_parameter_values(name, size_distribution)
+    return {
+        key: {
+            "unit": unit_of(key),
+            # Function-valued parameters can still be overridden by a constant
+            "function": callable(value),
+            "bounds": parameter_bounds(key),
+        }
+        for key, value in param.items()
+    }
+
+
+def parameter_schema(battery_type, selected_model=None, name=None):
+    """Unit, bounds and kind of every parameter a request may override,
+    built once per parameter set."""
+    return _schema(
+        resolve_parameter_set(battery_type, selected_model, name),
+        (battery_type, selected_model) in SIZE_DISTRIBUTION_MODELS,
+    )
+
+
+def build_schemas():
+    """Precompute the schema of every chemistry, model and parameter set."""
+    from .pybamm_runner import chemistries
+
+    for battery_type, (models, _) in chemistries.items():
+        for selected_model in models:
+            for name in available_sets(battery_type, selected_model):
+                parameter_schema(battery_type, selected_model, name)
+
+
+def scalar_values(param):
+    # Function-valued entries (OCPs, diffusivities) have no single value to show
+    return {
+        key: float(value)
+        for key, value in param.items()
+        if isinstance(value, numbers.Number) and not isinstance(value, bool)
+    }
+
+
+@lru_cache(maxsize=None)
+def catalog():
+    """Every chemistry's parameter sets with their keys and scalar values,
+    and which sets each model accepts."""
+    from .pybamm_runner import chemistries
+
+    result = {"pybamm_version": pybamm.__version__, "chemistries": {}}
+    for battery_type, (models, _) in chemistries.items():
+        sets = {}
+        model_sets = {}
+        for selected_model in models:
+            names = available_sets(battery_type, selected_model)
+            model_sets[selected_model] = {"default": names[0], "parameter_sets": list(names)}
+            for name in names:
+                if name not in sets:
+                    param = load_parameter_values(name)
+                    sets[name] = {
+                        "keys": sorted(param.keys()),
+                        "values": scalar_values(param),
+                    }
+        result["chemistries"][battery_type] = {
+            "default": PARAMETER_SETS[battery_type][0],
+            "models": model_sets,
+            "parameter_sets": sets,
+        }
+    return result
+
+
+@lru_cache(maxsize=None)
+def catalog_etag():
+    payload = json.dumps(catalog(), sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()[:32]
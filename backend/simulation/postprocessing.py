@@ -0,0 +1,117 @@
+import numpy as np
+
+# Kept by the solver alongside the series, for the resistance estimate
+OPEN_CIRCUIT_VOLTAGE = "Battery open-circuit voltage [V]"
+
+# Derived metrics a request can ask for with "metrics"; all of them by default
+METRICS = (
+    "Duration [s]",
+    "Discharge capacity [A.h]",
+    "Charge capacity [A.h]",
+    "Capacity throughput [A.h]",
+    "Discharge energy [W.h]",
+    "Charge energy [W.h]",
+    "Average discharge voltage [V]",
+    "Average power [W]",
+    "Peak power [W]",
+    "Resistance [Ohm]",
+    "Pulse resistance [Ohm]",
+    "Initial State of Charge [%]",
+    "Final State of Charge [%]",
+)
+
+# Rows of the buffer the metrics are computed on
+TIME, VOLTAGE, CURRENT, OCV, SOC = range(5)
+# Currents below this fraction of the peak don't give a usable V/I
+CURRENT_FLOOR = 0.01
+# Current steps at least this fraction of the peak count as pulses
+PULSE_STEP = 0.05
+
+
+def resolve_metrics(names=None):
+    if names is None:
+        return list(METRICS)
+    unknown = [name for name in names if name not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    return [name for name in METRICS if name in names]
+
+
+def open_circuit_voltage(solution):
+    # Not every model defines it, sodium-ion BasicDFN doesn't
+    if OPEN_CIRCUIT_VOLTAGE not in solution.all_models[0].variables:
+        return None
+    return solution[OPEN_CIRCUIT_VOLTAGE].entries
+
+
+def stack(series, ocv=None):
+    """Time, voltage, current, open-circuit voltage and SoC as one
+    contiguous (5, n) float array, NaN rows for what the model lacks."""
+    buffer = np.full((5, len(series["Time [s]"])), np.nan)
+    buffer[TIME] = series["Time [s]"]
+    buffer[VOLTAGE] = series["Voltage [V]"]
+    buffer[CURRENT] = series["Current [A]"]
+    if ocv is not None:
+        buffer[OCV] = ocv
+    if "State of Charge [%]" in series:
+        buffer[SOC] = series["State of Charge [%]"]
+    return buffer
+
+
+def median_or_none(values):
+    values = values[np.isfinite(values)]
+    return float(np.median(values)) if len(values) else None
+
+
+def derived_metrics(series, ocv=None, names=None):
+    """Metrics over a solution's series, computed in one vectorised pass.
+
+    Integrals use the trapezoidal rule over the solver's own time points.
+    Current is positive on discharge, so positive power is discharge
+    energy. Metrics a model can't provide come back as None.
+    """
+    names = resolve_metrics(names)
+    if not names:
+        return {}
+    buffer = stack(series, ocv)
+    t, voltage, current = buffer[TIME], buffer[VOLTAGE], buffer[CURRENT]
+    power = voltage * current
+    # Trapezoid increments of charge (A.h) and energy (W.h) per interval
+    rates = np.stack((current, power))
+    charge, energy = 0.5 * (rates[:, 1:] + rates[:, :-1]) * np.diff(t) / 3600
+    duration = float(t[-1] - t[0])
+
+    discharge_capacity = float(charge[charge > 0].sum())
+    discharge_energy = float(energy[energy > 0].sum())
+    metrics = {
+        "Duration [s]": duration,
+        "Discharge capacity [A.h]": discharge_capacity,
+        "Charge capacity [A.h]": float(np.abs(charge[charge < 0]).sum()),
+        "Capacity throughput [A.h]": float(np.abs(charge).sum()),
+        "Discharge energy [W.h]": discharge_energy,
+        "Charge energy [W.h]": float(np.abs(energy[energy < 0]).sum()),
+        "Average discharge voltage [V]": (
+            discharge_energy / discharge_capacity if discharge_capacity > 0 else None
+        ),
+        "Average power [W]": float(np.abs(energy).sum() * 3600 / duration) if duration else None,
+        "Peak power [W]": float(np.abs(power).max()),
+    }
+
+    # Overpotential over current wherever enough current flows
+    peak = np.abs(current).max()
+    if "Resistance [Ohm]" in names:
+        flowing = np.abs(current) > CURRENT_FLOOR * peak
+        metrics["Resistance [Ohm]"] = median_or_none(
+            (buffer[OCV, flowing] - voltage[flowing]) / current[flowing]
+        )
+    # Finite differences across current steps: the instantaneous voltage drop
+    if "Pulse resistance [Ohm]" in names:
+        d_current = np.diff(current)
+        steps = np.abs(d_current) > PULSE_STEP * peak
+        metrics["Pulse resistance [Ohm]"] = median_or_none(
+            -np.diff(voltage)[steps] / d_current[steps]
+        )
+    soc = buffer[SOC]
+    metrics["Initial State of Charge [%]"] = float(soc[0]) if np.isfinite(soc[0]) else None
+    metrics["Final State of Charge [%]"] = float(soc[-1]) if np.isfinite(soc[-1]) else None
+    return {name: metrics[name] for name in names}
@@ -1,71 +1,404 @@
 import pybamm
-import matplotlib.pyplot as plt
 import io
 import base64
-import matplotlib
-matplotlib.use('Agg')
+import json
+import time
+from functools import lru_cache
 
+import numpy as np
+from django.conf import settings
 
+from .experiments import parse_experiment
+from .memory import PeakMemory
+from .model_cache import ModelCache
+from .parameter_sets import get_parameter_values, resolve_parameter_set
+from .postprocessing import (
+    OPEN_CIRCUIT_VOLTAGE,
+    derived_metrics,
+    open_circuit_voltage,
+    resolve_metrics,
+)
+from .solvers import make_solver, resolve_solver_options
 
-def run_simulation(battery_type, params_from_request,selected_model):
-    lithium_models = {
-        "SPM": pybamm.lithium_ion.SPM,
-        "SPMe": pybamm.lithium_ion.SPMe,
-        "DFN": pybamm.lithium_ion.DFN,
-        "MPM": pybamm.lithium_ion.MPM,
-        "MSMR": pybamm.lithium_ion.MSMR,
-    }
 
-    lead_acid_models = {
-        "LOQS": pybamm.lead_acid.LOQS,
-        "Full": pybamm.lead_acid.Full,
-    }
-    sodium_ion_models = {
-        "SPM": pybamm.sodium_ion.SPM,
-        "SPMe": pybamm.sodium_ion.SPMe,
-        "DFN": pybamm.sodium_ion.DFN,
-        "BasicDFN": pybamm.sodium_ion.BasicDFN,
-    }
-    # Select model and parameters
-    if battery_type == "lithium-ion":
-        model_class = lithium_models[selected_model]
-        model=model_class()
-        param = pybamm.ParameterValues("Chen2020")
-    elif battery_type == "lead-acid":
-        model_class = lead_acid_models[selected_model]
-        model=model_class()
-        param = pybamm.ParameterValues("Sulzer2019")
-    elif battery_type == "sodium-ion":
-        model_class = sodium_ion_models[selected_model]
-        model = model_class()
-        param = pybamm.ParameterValues("Chen2020")  # Base parameters, will need Na-ion specific ones
-       
-    else:
+lithium_models = {
+    "SPM": pybamm.lithium_ion.SPM,
+    "SPMe": pybamm.lithium_ion.SPMe,
+    "DFN": pybamm.lithium_ion.DFN,
+    "MPM": pybamm.lithium_ion.MPM,
+    "MSMR": pybamm.lithium_ion.MSMR,
+}
+
+lead_acid_models = {
+    "LOQS": pybamm.lead_acid.LOQS,
+    "Full": pybamm.lead_acid.Full,
+}
+# Some PyBaMM releases only ship BasicDFN for sodium-ion
+sodium_ion_models = {
+    name: getattr(pybamm.sodium_ion, name)
+    for name in ("SPM", "SPMe", "DFN", "BasicDFN")
+    if hasattr(pybamm.sodium_ion, name)
+}
+
+# battery_type -> (model table, parameter set)
+chemistries = {
+    "lithium-ion": (lithium_models, "Chen2020"),
+    "lead-acid": (lead_acid_models, "Sulzer2019"),
+    "sodium-ion": (sodium_ion_models, "Chayambuka2022"),
+}
+# Options a model can't be built without
+DEFAULT_MODEL_OPTIONS = {
+    ("lithium-ion", "MSMR"): {"number of MSMR reactions": ("6", "4")},
+}
+
+# Scalar outputs behind every result and its metrics, kept when the model has them
+SERIES_VARIABLES = [
+    "Time [s]",
+    "Voltage [V]",
+    "Current [A]",
+    "Volume-averaged cell temperature [K]",
+    "State of Charge",
+    "Discharge capacity [A.h]",
+    OPEN_CIRCUIT_VOLTAGE,
+]
+
+model_cache = ModelCache(
+    max_entries=getattr(settings, "SIMULATION_MODEL_CACHE_SIZE", 8),
+    max_bytes=getattr(settings, "SIMULATION_MODEL_CACHE_MAX_MB", 512) * 1024 * 1024,
+)
+
+
+def is_geometric(name):
+    # Lengths change the mesh, so PyBaMM can't take them as input parameters
+    return name.endswith("[m]")
+
+
+def output_variables(model, extra=None):
+    """Variables a solve has to keep for extract_series plus ``extra``."""
+    names = [name for name in SERIES_VARIABLES if name in model.variables]
+    for name in extra or ():
+        if name not in model.variables:
+            raise ValueError(f"Unknown variable: {name}")
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def get_model_class(battery_type, selected_model):
+    if battery_type not in chemistries:
         raise ValueError(f"Unsupported battery type: {battery_type}")
-    
+    models, _ = chemistries[battery_type]
+    if selected_model not in models:
+        raise ValueError(f"Unsupported model for {battery_type}: {selected_model}")
+    return models[selected_model]
+
+
+def make_model(battery_type, selected_model, options=None):
+    model_class = get_model_class(battery_type, selected_model)
+    options = {**DEFAULT_MODEL_OPTIONS.get((battery_type, selected_model), {}), **(options or {})}
+    # Basic models such as sodium-ion BasicDFN take no options
+    return model_class(options=options) if options else model_class()
+
+
+@lru_cache(maxsize=None)
+def model_names(battery_type, selected_model):
+    """The variable names and mesh point names of a model, for validation."""
+    model = make_model(battery_type, selected_model)
+    return frozenset(model.variables), frozenset(model.default_var_pts)
 
+
+def get_simulation(
+    battery_type,
+    selected_model,
+    param,
+    overrides,
+    var_pts=None,
+    solver_options=None,
+    experiment=None,
+    model_options=None,
+    variables=None,
+    timings=None,
+    parameter_set=None,
+):
+    """Return a cached simulation with the overrides set up as inputs.
+
+    Geometric overrides are baked into the model, everything else becomes a
+    ``pybamm.InputParameter`` so a cache hit can go straight to the solve.
+    With an ``experiment`` the per-step models are compiled once and reused
+    by every request running the same protocol. Otherwise the solver only
+    stores the scalar outputs (see output_variables) rather than every
+    spatial field at every timestep. On a cache miss ``timings`` gets the
+    build and discretise seconds. ``param`` must be the values of
+    ``parameter_set`` (the model's default set when None).
+    """
+    get_model_class(battery_type, selected_model)
+    parameter_set = resolve_parameter_set(battery_type, selected_model, parameter_set)
+    solver_options = resolve_solver_options(solver_options)
+    protocol = None
+    if experiment is not None:
+        protocol, canonical = parse_experiment(experiment)
+        # The experiment steps set the current
+        overrides = {k: v for k, v in overrides.items() if k != "Current function [A]"}
+    var_pts = {k: int(v) for k, v in (var_pts or {}).items()}
+    geometry = {k: v for k, v in overrides.items() if is_geometric(k)}
+    inputs = {k: float(v) for k, v in overrides.items() if not is_geometric(k)}
+    key = (
+        battery_type,
+        selected_model,
+        parameter_set,
+        tuple(sorted(var_pts.items())),
+        tuple(sorted(geometry.items())),
+        tuple(sorted(inputs)),
+        # Output resolution only changes t_eval, not the compiled solver
+        tuple(sorted((k, v) for k, v in solver_options.items() if k != "output_points")),
+        json.dumps(canonical, sort_keys=True) if protocol is not None else None,
+        tuple(sorted((model_options or {}).items())),
+        tuple(sorted(variables or ())),
+    )
+
+    def build():
+        started = time.perf_counter()
+        model_param = param.copy()
+        model_param.update(geometry)
+        model_param.update({k: "[input]" for k in inputs})
+        model = make_model(battery_type, selected_model, model_options)
+        # Experiments need the full state to hand over between steps
+        names = output_variables(model, variables) if protocol is None else None
+        sim = pybamm.Simulation(
+            model,
+            parameter_values=model_param,
+            # Meshes missing from a partial var_pts keep the model's defaults
+            var_pts={**model.default_var_pts, **var_pts} if var_pts else None,
+            solver=make_solver(solver_options, model, names),
+            experiment=protocol,
+        )
+        built = time.perf_counter()
+        if protocol is not None:
+            sim.build_for_experiment()
+        else:
+            sim.build()
+        if timings is not None:
+            timings["build"] = built - started
+            timings["discretise"] = time.perf_counter() - built
+        return sim
+
+    entry, _ = model_cache.get_or_build(key, build)
+    return entry, inputs
+
+
+def get_control(params_from_request, *names, default=None):
+    # The frontend and API clients spell control values differently
+    for name in names:
+        if name in params_from_request:
+            return float(params_from_request[name])
+    return default
+
+
+def get_duration(params_from_request):
+    return get_control(
+        params_from_request, "duration", "Simulation duration [s]", default=3600
+    )
+
+
+def filter_params(param, params_from_request):
     # Filter out invalid parameters
-    valid_keys = set(param.keys())
     filtered_params = {
-        k: v for k, v in params_from_request.items() if k in valid_keys
+        k: v for k, v in params_from_request.items() if k in param
+    }
+
+    c_rate = get_control(params_from_request, "c_rate", "C-rate")
+    if c_rate is not None:
+        capacity = filtered_params.get(
+            "Nominal cell capacity [A.h]", param["Nominal cell capacity [A.h]"]
+        )
+        filtered_params["Current function [A]"] = c_rate * float(capacity)
+    return filtered_params
+
+
+def solve(
+    battery_type,
+    params_from_request,
+    selected_model,
+    var_pts=None,
+    t_eval=None,
+    solver_options=None,
+    timings=None,
+    experiment=None,
+    variables=None,
+    sensitivities=None,
+    parameter_set=None,
+):
+    """Solve on the cached model. Fills ``timings`` with setup/solve seconds,
+    plus build/discretise on a model cache miss, when a dict is passed in.
+    ``sensitivities`` names inputs to compute forward sensitivities for
+    (IDAKLU only).
+
+    Experiments run until their last step finishes, so the duration and
+    output grid don't apply to them.
+    """
+    started = time.perf_counter()
+    # Select model and parameters
+    get_model_class(battery_type, selected_model)
+    solver_options = resolve_solver_options(solver_options)
+    param = get_parameter_values(battery_type, selected_model, parameter_set)
+    filtered_params = filter_params(param, params_from_request)
+
+    output_grid = None
+    if experiment is not None:
+        t_eval = None
+    elif t_eval is None:
+        duration = get_duration(params_from_request)
+        t_eval = [0, duration]
+        if solver_options["output_points"]:
+            output_grid = np.linspace(0, duration, solver_options["output_points"])
+
+    # Run simulation on the cached model
+    entry, inputs = get_simulation(
+        battery_type,
+        selected_model,
+        param,
+        filtered_params,
+        var_pts,
+        solver_options,
+        experiment,
+        variables=variables,
+        timings=timings,
+        parameter_set=parameter_set,
+    )
+    setup_done = time.perf_counter()
+    with entry.lock:
+        sim = entry.value
+        kwargs = {}
+        if sensitivities:
+            kwargs["calculate_sensitivities"] = list(sensitivities)
+        if output_grid is not None:
+            # IDAKLU interpolates onto the grid, other solvers step to each point
+            if isinstance(sim.solver, pybamm.IDAKLUSolver):
+                kwargs["t_interp"] = output_grid
+            else:
+                t_eval = output_grid
+        try:
+            return sim.solve(t_eval=t_eval, inputs=inputs, **kwargs)
+        finally:
+            # Don't keep the last solution alive inside the cache
+            sim._solution = None
+            if timings is not None:
+                built = timings.get("build", 0) + timings.get("discretise", 0)
+                timings["setup"] = setup_done - started - built
+                timings["solve"] = time.perf_counter() - setup_done
+
+
+def get_nominal_capacity(
+    battery_type, params_from_request, selected_model=None, parameter_set=None
+):
+    param = get_parameter_values(battery_type, selected_model, parameter_set)
+    return float(
+        params_from_request.get(
+            "Nominal cell capacity [A.h]", param["Nominal cell capacity [A.h]"]
+        )
+    )
+
+
+def extract_series(solution, nominal_capacity, extra=None):
+    # Scalar time series returned to the client, skipping what a model doesn't have
+    variables = output_variables(solution.all_models[0], extra)
+    series = {
+        "Time [s]": solution["Time [s]"].entries,
+        "Voltage [V]": solution["Voltage [V]"].entries,
+        "Current [A]": solution["Current [A]"].entries,
     }
+    if "Volume-averaged cell temperature [K]" in variables:
+        series["Temperature [K]"] = solution["Volume-averaged cell temperature [K]"].entries
+    if "State of Charge" in variables:
+        series["State of Charge [%]"] = solution["State of Charge"].entries
+    elif "Discharge capacity [A.h]" in variables:
+        # Parameter sets start fully charged
+        discharged = solution["Discharge capacity [A.h]"].entries
+        series["State of Charge [%]"] = 100 * (1 - discharged / nominal_capacity)
+    for name in extra or ():
+        values = solution[name].entries
+        if values.ndim != 1:
+            raise ValueError(f"{name} is not a scalar time series")
+        series[name] = values
+    return series
+
 
-    # Safely update model parameters
-    param.update(filtered_params)
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets point selection.
 
-    c_rate = float(params_from_request.get("c_rate", 1))
-    duration = float(params_from_request.get("duration", 3600))  # seconds
-    t_eval = [0, duration]
+    ``y`` is (n, k); with several columns the triangle areas are summed over
+    them, so a point is kept when it matters for any of the variables.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:n_out]
 
-    # Run simulation
-    sim = pybamm.Simulation(model, parameter_values=param)
-    sim.solve(t_eval=t_eval)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    index = np.empty(n_out, dtype=int)
+    index[0], index[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            cx = x[end:edges[i + 2]].mean()
+            cy = y[end:edges[i + 2]].mean(axis=0)
+        else:
+            cx, cy = x[-1], y[-1]
+        bx, by = x[start:end], y[start:end]
+        area = np.abs(
+            (x[a] - cx) * (by - y[a]) - (x[a] - bx)[:, None] * (cy - y[a])
+        ).sum(axis=1)
+        a = start + int(np.argmax(area))
+        index[i + 1] = a
+    return index
+
+
+def downsample(series, max_points):
+    """Reduce every variable to at most ``max_points`` shared samples.
+
+    Points are picked with LTTB against time, so peaks and knees survive
+    where uniform decimation would step over them.
+    """
+    n = len(next(iter(series.values())))
+    if n <= max_points:
+        return series
+    x = np.asarray(series.get("Time [s]", np.arange(n)), dtype=float)
+    columns = [
+        np.asarray(values, dtype=float)
+        for name, values in series.items()
+        if name != "Time [s]"
+    ]
+    y = np.column_stack(columns) if columns else np.zeros((n, 1))
+    # Scale each variable to unit range so volts and kelvin weigh the same
+    span = np.ptp(y, axis=0)
+    y = (y - y.min(axis=0)) / np.where(span > 0, span, 1)
+    index = lttb_indices(x, y, int(max_points))
+    return {name: values[index] for name, values in series.items()}
+
+
+def encode_series(series):
+    # Little-endian float32 arrays. JSON carries them base64 encoded (see
+    # renderers.SeriesEncoder), which the frontend decodes into Float32Array
+    return {
+        "encoding": "base64-float32-le",
+        "length": len(next(iter(series.values()))),
+        "variables": {
+            name: np.ascontiguousarray(values, dtype="<f4") for name, values in series.items()
+        },
+    }
+
+
+def render_plot(series, battery_type):
+    # Only imported when PNG output is requested
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
 
     # Generate and encode plot
-    solution=sim.solution
-    var=solution["Terminal voltage [V]"]
     plt.figure(figsize=(8, 4))
-    plt.plot(solution["Time [s]"].entries, var.entries)
+    plt.plot(series["Time [s]"], series["Voltage [V]"])
     plt.xlabel("Time [s]")
     plt.ylabel("Terminal Voltage [V]")
     plt.title(f"{battery_type.capitalize()} Battery Voltage Over Time")
@@ -77,10 +410,240 @@ def run_simulation(battery_type, params_from_request,selected_model):
     buf.seek(0)
     img_b64 = base64.b64encode(buf.read()).decode("utf-8")
     plt.close()
+    return img_b64
 
-    return {
+
+def run_simulation(
+    battery_type,
+    params_from_request,
+    selected_model,
+    var_pts=None,
+    output="arrays",
+    max_points=500,
+    return_series=False,
+    solver=None,
+    experiment=None,
+    variables=None,
+    parameter_set=None,
+    metrics=None,
+):
+    if output not in ("arrays", "png"):
+        raise ValueError(f"Unsupported output: {output}")
+    metrics = resolve_metrics(metrics)
+
+    timings = {}
+    with PeakMemory() as memory:
+        solution = solve(
+            battery_type,
+            params_from_request,
+            selected_model,
+            var_pts,
+            solver_options=solver,
+            timings=timings,
+            experiment=experiment,
+            variables=variables,
+            parameter_set=parameter_set,
+        )
+        postprocess_started = time.perf_counter()
+        capacity = get_nominal_capacity(
+            battery_type, params_from_request, selected_model, parameter_set
+        )
+        series = extract_series(solution, capacity, variables)
+        result_metrics = derived_metrics(series, open_circuit_voltage(solution), metrics)
+        termination = solution.termination
+        # Only the extracted arrays are needed from here on
+        del solution
+
+        render_started = time.perf_counter()
+        timings["postprocess"] = render_started - postprocess_started
+        result = format_result(series, termination, battery_type, output, max_points)
+        timings["render"] = time.perf_counter() - render_started
+    timings["total"] = sum(timings.values())
+    result["metrics"] = result_metrics
+    result["timings"] = timings
+    result["memory"] = memory.report()
+    if return_series:
+        # Full resolution, for storing the run
+        return result, series
+    return result
+
+
+def format_result(series, termination, battery_type, output, max_points):
+    result = {
         "status": "success",
-        "plot_base64": img_b64,
         "summary": "Simulation completed",
-        "image":"plot.png"
+        "termination": termination,
+    }
+    if output == "png":
+        result["plot_base64"] = render_plot(series, battery_type)
+        result["image"] = "plot.png"
+    else:
+        result["series"] = encode_series(downsample(series, int(max_points)))
+    return result
+
+
+def stream_simulation(
+    battery_type,
+    params_from_request,
+    selected_model,
+    var_pts=None,
+    chunks=20,
+    max_points=500,
+    solver=None,
+    experiment=None,
+    parameter_set=None,
+    metrics=None,
+):
+    """Step through the run in chunks, yielding ("progress", data) per chunk
+    and ("result", data) at the end.
+
+    The cache entry is only locked while a chunk is solving, so a slow
+    reader doesn't block other requests for the same model. Closing the
+    generator stops the run.
+    """
+    get_model_class(battery_type, selected_model)
+    metrics = resolve_metrics(metrics)
+    timings = {}
+
+    def extract(solution):
+        postprocess_started = time.perf_counter()
+        capacity = get_nominal_capacity(
+            battery_type, params_from_request, selected_model, parameter_set
+        )
+        series = extract_series(solution, capacity)
+        result_metrics = derived_metrics(series, open_circuit_voltage(solution), metrics)
+        timings["postprocess"] = time.perf_counter() - postprocess_started
+        return series, result_metrics
+
+    def finish(series, result_metrics, termination):
+        render_started = time.perf_counter()
+        result = format_result(series, termination, battery_type, "arrays", max_points)
+        timings["render"] = time.perf_counter() - render_started
+        timings["total"] = sum(timings.values())
+        result["metrics"] = result_metrics
+        result["timings"] = timings
+        return result
+
+    if experiment is not None:
+        # Experiments step through their own protocol, report them in one go
+        solution = solve(
+            battery_type,
+            params_from_request,
+            selected_model,
+            var_pts,
+            solver_options=solver,
+            timings=timings,
+            experiment=experiment,
+            parameter_set=parameter_set,
+        )
+        series, result_metrics = extract(solution)
+        curve = downsample(
+            {"Time [s]": series["Time [s]"], "Voltage [V]": series["Voltage [V]"]}, 50
+        )
+        yield "progress", {
+            "progress": 1.0,
+            "time": curve["Time [s]"].tolist(),
+            "voltage": curve["Voltage [V]"].tolist(),
+        }
+        yield "result", finish(series, result_metrics, solution.termination)
+        return
+
+    started = time.perf_counter()
+    param = get_parameter_values(battery_type, selected_model, parameter_set)
+    filtered_params = filter_params(param, params_from_request)
+    duration = get_duration(params_from_request)
+    dt = duration / int(chunks)
+
+    entry, inputs = get_simulation(
+        battery_type,
+        selected_model,
+        param,
+        filtered_params,
+        var_pts,
+        solver,
+        timings=timings,
+        parameter_set=parameter_set,
+    )
+    built = timings.get("build", 0) + timings.get("discretise", 0)
+    timings["setup"] = time.perf_counter() - started - built
+    # Solver time only, not the time spent waiting on the client
+    timings["solve"] = 0.0
+    solution = None
+    sent = 0
+    while True:
+        with entry.lock:
+            sim = entry.value
+            step_started = time.perf_counter()
+            try:
+                solution = sim.step(
+                    dt, starting_solution=solution, inputs=inputs, save=True
+                )
+            finally:
+                sim._solution = None
+                timings["solve"] += time.perf_counter() - step_started
+
+        t = solution["Time [s]"].entries
+        voltage = solution["Voltage [V]"].entries
+        new = downsample({"Time [s]": t[sent:], "Voltage [V]": voltage[sent:]}, 50)
+        sent = len(t)
+        yield "progress", {
+            "progress": min(float(t[-1]) / duration, 1.0),
+            "time": new["Time [s]"].tolist(),
+            "voltage": new["Voltage [V]"].tolist(),
+        }
+        # Stop at the end of the run or when the solver hit a cut-off event
+        if t[-1] >= duration * (1 - 1e-9) or solution.termination.startswith("event"):
+            break
+
+    yield "result", finish(*extract(solution), solution.termination)
+
+
+def normalize_request(data):
+    # Everything that affects a simulate response, in canonical form
+    battery_type = data.get("battery_type")
+    selected_model = data.get("selected_model")
+    get_model_class(battery_type, selected_model)
+    params_from_request = data.get("params", {})
+    parameter_set = resolve_parameter_set(
+        battery_type, selected_model, data.get("parameter_set")
+    )
+    param = get_parameter_values(battery_type, selected_model, parameter_set)
+    return {
+        "battery_type": battery_type,
+        "selected_model": selected_model,
+        "parameter_set": parameter_set,
+        "params": {
+            k: float(v) for k, v in filter_params(param, params_from_request).items()
+        },
+        "duration": get_duration(params_from_request),
+        "var_pts": {k: int(v) for k, v in (data.get("var_pts") or {}).items()},
+        "output": data.get("output", "arrays"),
+        "max_points": int(data.get("max_points", 500)),
+        "solver": resolve_solver_options(data.get("solver")),
+        "variables": sorted(data.get("variables") or []),
+        "metrics": resolve_metrics(data.get("metrics")),
+        "experiment": (
+            parse_experiment(data["experiment"])[1]
+            if data.get("experiment") is not None
+            else None
+        ),
+        "pybamm_version": pybamm.__version__,
     }
+
+
+def run_from_request(data, return_series=False):
+    # Map a /api/simulate/ payload onto run_simulation
+    return run_simulation(
+        data.get("battery_type"),
+        data.get("params", {}),
+        data.get("selected_model"),
+        var_pts=data.get("var_pts"),
+        output=data.get("output", "arrays"),
+        max_points=data.get("max_points", 500),
+        return_series=return_series,
+        solver=data.get("solver"),
+        experiment=data.get("experiment"),
+        variables=data.get("variables"),
+        parameter_set=data.get("parameter_set"),
+        metrics=data.get("metrics"),
+    )
@@ -0,0 +1,134 @@
+import base64
+import io
+import json
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import pyarrow
+except ImportError:  # Arrow output is optional, NPY and JSON work without it
+    pyarrow = None
+
+# Encoding of series in simulate results, see pybamm_runner.encode_series
+SERIES_ENCODING = "base64-float32-le"
+
+
+class SeriesEncoder(JSONEncoder):
+    """DRF's JSON encoder, with the float32 arrays of encoded series written
+    as base64 strings. Results keep the arrays until they're serialized, so
+    the binary renderers use them as they are."""
+
+    def default(self, obj):
+        if isinstance(obj, np.ndarray) and obj.dtype == np.dtype("<f4"):
+            return base64.b64encode(obj.tobytes()).decode("ascii")
+        return super().default(obj)
+
+
+class SeriesJSONRenderer(JSONRenderer):
+    encoder_class = SeriesEncoder
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=SeriesEncoder)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets EventSource clients (Accept: text/event-stream) through content
+    negotiation. Streaming views write their own events; anything rendered
+    here is an error response."""
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event("error", data).encode(self.charset)
+
+
+def split_series(data):
+    """The encoded series of a result and the rest of it, or (None, data)
+    for responses without series (errors, PNG output, job status)."""
+    if not isinstance(data, dict):
+        return None, data
+    # Run variables are the encoded series themselves
+    if data.get("encoding") == SERIES_ENCODING:
+        return data, {}
+    series = data.get("series")
+    if isinstance(series, dict) and series.get("encoding") == SERIES_ENCODING:
+        return series, {k: v for k, v in data.items() if k != "series"}
+    return None, data
+
+
+def decode_series(encoded):
+    # Fresh results hold the arrays; only stored job results come back as
+    # base64, decoded to views over the bytes with no per-value conversion
+    return {
+        name: np.frombuffer(base64.b64decode(values), dtype="<f4")
+        if isinstance(values, str)
+        else values
+        for name, values in encoded["variables"].items()
+    }
+
+
+class SeriesRenderer(BaseRenderer):
+    """Base for binary renderers of simulation series. Anything without
+    series falls back to JSON, with the Content-Type to match."""
+
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        encoded, metadata = split_series(data)
+        response = (renderer_context or {}).get("response")
+        if encoded is None:
+            if response is not None:
+                response["Content-Type"] = JSONRenderer.media_type
+            return SeriesJSONRenderer().render(data, renderer_context=renderer_context)
+        return self.render_series(decode_series(encoded), metadata, response)
+
+    def render_series(self, series, metadata, response):
+        raise NotImplementedError
+
+
+class NpyRenderer(SeriesRenderer):
+    """One structured NumPy array with a float32 field per variable:
+    ``np.load(f)["Voltage [V]"]``. The rest of the result (termination,
+    metrics, timings) goes in the ``X-Sim-Metadata`` header as JSON."""
+
+    media_type = "application/x-npy"
+    format = "npy"
+
+    def render_series(self, series, metadata, response):
+        length = len(next(iter(series.values()))) if series else 0
+        array = np.empty(length, dtype=[(name, "<f4") for name in series])
+        for name, values in series.items():
+            array[name] = values
+        if response is not None and metadata:
+            response["X-Sim-Metadata"] = json.dumps(metadata)
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        return buffer.getvalue()
+
+
+class ArrowRenderer(SeriesRenderer):
+    """An Arrow IPC stream with a float32 column per variable, built on the
+    result's arrays without copying. The rest of the result is JSON under
+    the schema's ``simulation`` metadata key."""
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+
+    def render_series(self, series, metadata, response):
+        table = pyarrow.table(
+            {name: pyarrow.array(values) for name, values in series.items()},
+            metadata={"simulation": json.dumps(metadata)},
+        )
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+# Renderers for views that return simulation series; JSON stays the default
+SERIES_RENDERERS = [SeriesJSONRenderer, NpyRenderer] + ([ArrowRenderer] if pyarrow else [])
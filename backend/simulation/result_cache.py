@@ -0,0 +1,121 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics, storage
+from .pybamm_runner import normalize_request, run_from_request
+from .supervisor import run_supervised
+
+
+def make_key(data):
+    # Hash of the normalized request, so equivalent payloads share an entry
+    payload = json.dumps(normalize_request(data), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """In-memory LRU in front of a shared Django cache backend."""
+
+    def __init__(self, alias, max_entries=64, timeout=3600):
+        self.alias = alias
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > time.monotonic():
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        value = caches[self.alias].get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._remember(key, value)
+        return value
+
+    def contains(self, key):
+        # Lookup without touching the hit/miss counters
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and item[0] > time.monotonic():
+                return True
+        return caches[self.alias].has_key(key)
+
+    def set(self, key, value):
+        caches[self.alias].set(key, value, self.timeout)
+        with self._lock:
+            self._remember(key, value)
+
+    def _remember(self, key, value):
+        self._memory[key] = (time.monotonic() + self.timeout, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._memory), "hits": self.hits, "misses": self.misses}
+
+
+result_cache = ResultCache(
+    "simulation_results",
+    max_entries=getattr(settings, "SIMULATION_RESULT_CACHE_MEMORY_ENTRIES", 64),
+    timeout=getattr(settings, "SIMULATION_RESULT_CACHE_TIMEOUT", 3600),
+)
+
+
+def is_cached(data, persist=False):
+    """Whether run_cached would answer ``data`` without solving."""
+    key = make_key(data)
+    if persist and not storage.has_series(storage.series_path(key)):
+        return False
+    return result_cache.contains(key)
+
+
+def run_cached(data, bypass=False, persist=False):
+    """Run a simulate request through the result cache.
+
+    Returns (result, cache_status, key) where cache_status is "hit", "miss"
+    or "bypass". With persist=True the full-resolution series is also
+    written to storage.series_path(key), re-solving if it isn't there yet.
+    """
+    key = make_key(data)
+    path = storage.series_path(key)
+    need_series = persist and not storage.has_series(path)
+
+    if not bypass and not need_series:
+        result = result_cache.get(key)
+        if result is not None:
+            return result, "hit", key
+
+    # In a supervised child process when SIMULATION_ISOLATE is on
+    # The full-resolution series only crosses the pipe when it's stored
+    result = run_supervised(run_from_request, data, return_series=persist)
+    if persist:
+        result, series = result
+    metrics.record_simulation(
+        data.get("battery_type"), data.get("selected_model"), result["timings"], result["memory"]
+    )
+    if persist:
+        storage.save_series(path, series)
+    if bypass:
+        return result, "bypass", key
+    result_cache.set(key, result)
+    return result, "miss", key
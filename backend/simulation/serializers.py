@@ -0,0 +1,188 @@
+import math
+
+from rest_framework import serializers
+
+from .experiments import parse_experiment
+from .models import SimulationRun
+from .parameter_sets import parameter_schema
+from .postprocessing import METRICS
+from .pybamm_runner import chemistries, model_names
+from .solvers import resolve_solver_options
+
+# Request controls that aren't PyBaMM parameters, see pybamm_runner.get_control
+CONTROL_BOUNDS = {
+    "duration": (0.0, None, False),
+    "Simulation duration [s]": (0.0, None, False),
+    "c_rate": (-100.0, 100.0, True),
+    "C-rate": (-100.0, 100.0, True),
+}
+
+# The shape of a simulation request. The fields are only ever run on their
+# own values, never bound to a serializer, so they are built once and shared:
+# DRF deep-copies a serializer's fields for every instance, which was most of
+# the validation time.
+REQUEST_FIELDS = {
+    "battery_type": serializers.ChoiceField(choices=sorted(chemistries)),
+    "selected_model": serializers.CharField(),
+    "parameter_set": serializers.CharField(required=False, allow_null=True),
+    "params": serializers.DictField(required=False),
+    "var_pts": serializers.DictField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_null=True
+    ),
+    "max_points": serializers.IntegerField(min_value=2, required=False),
+    "output": serializers.ChoiceField(choices=("arrays", "png"), required=False),
+    "metrics": serializers.ListField(
+        child=serializers.ChoiceField(choices=METRICS), required=False, allow_null=True
+    ),
+    "solver": serializers.JSONField(required=False, allow_null=True),
+    "experiment": serializers.JSONField(required=False, allow_null=True),
+    "variables": serializers.ListField(
+        child=serializers.CharField(), required=False, allow_null=True
+    ),
+}
+
+
+class SimulationRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SimulationRun
+        fields = [
+            "id",
+            "battery_type",
+            "model_name",
+            "parameters",
+            "duration",
+            "termination",
+            "variables",
+            "n_points",
+            "created_at",
+        ]
+
+
+class InvalidRequest(ValueError):
+    """A request failed validation, ``errors`` has the messages per field."""
+
+    def __init__(self, errors):
+        super().__init__("Invalid simulation request")
+        self.errors = errors
+
+
+def check_value(value, bounds):
+    """Why ``value`` isn't valid within ``bounds``, or None if it is."""
+    if isinstance(value, bool):
+        return "Must be a number"
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return "Must be a number"
+    if not math.isfinite(number):
+        return "Must be a finite number"
+    low, high, inclusive = bounds
+    if low is not None and (number < low or (number == low and not inclusive)):
+        return f"Must be {'at least' if inclusive else 'greater than'} {low:g}, got {number:g}"
+    if high is not None and number > high:
+        return f"Must be at most {high:g}, got {number:g}"
+    return None
+
+
+def parameter_errors(schema, params):
+    errors = {}
+    for name, value in params.items():
+        bounds = CONTROL_BOUNDS.get(name)
+        if bounds is None:
+            if name not in schema:
+                errors[name] = ["Not a parameter of this chemistry, model and parameter set"]
+                continue
+            bounds = schema[name]["bounds"]
+        message = check_value(value, bounds)
+        if message:
+            errors[name] = [message]
+    return errors
+
+
+def field_errors(data):
+    """Run ``data`` through REQUEST_FIELDS, returning (values, errors)."""
+    values, errors = {}, {}
+    for name, field in REQUEST_FIELDS.items():
+        try:
+            if name in data:
+                values[name] = field.run_validation(data[name])
+            elif field.required:
+                field.fail("required")
+        except serializers.ValidationError as e:
+            errors[name] = e.detail
+    for name, check in (("solver", resolve_solver_options), ("experiment", parse_experiment)):
+        if values.get(name) is not None:
+            try:
+                check(values[name])
+            except ValueError as e:
+                errors[name] = [str(e)]
+    return values, errors
+
+
+def parse_max_points(value):
+    """``value`` as a max_points count, raising InvalidRequest unless it is one."""
+    try:
+        return REQUEST_FIELDS["max_points"].run_validation(value)
+    except serializers.ValidationError as e:
+        raise InvalidRequest({"max_points": e.detail})
+
+
+def request_schema(values):
+    """Check a request whose fields are valid against its chemistry, model
+    and parameter set, returning that set's parameter schema."""
+    battery_type = values["battery_type"]
+    selected_model = values["selected_model"]
+    if selected_model not in chemistries[battery_type][0]:
+        raise InvalidRequest(
+            {"selected_model": [f"Unsupported model for {battery_type}: {selected_model}"]}
+        )
+    try:
+        schema = parameter_schema(battery_type, selected_model, values.get("parameter_set"))
+    except ValueError as e:
+        raise InvalidRequest({"parameter_set": [str(e)]})
+    errors = parameter_errors(schema, values.get("params") or {})
+    if errors:
+        raise InvalidRequest({"params": errors})
+    if values.get("variables") or values.get("var_pts"):
+        variables, meshes = model_names(battery_type, selected_model)
+        unknown = [name for name in values.get("variables") or () if name not in variables]
+        if unknown:
+            raise InvalidRequest({"variables": [f"Unknown variable: {name}" for name in unknown]})
+        unknown = [name for name in values.get("var_pts") or {} if name not in meshes]
+        if unknown:
+            raise InvalidRequest(
+                {"var_pts": {name: ["Not a mesh dimension of this model"] for name in unknown}}
+            )
+    return schema
+
+
+def validate_simulation_request(data, points=None):
+    """Raise InvalidRequest unless ``data`` (and each batch point in
+    ``points``) only sets known parameters to physically valid values,
+    checked against the precomputed schemas before any solve."""
+    if not isinstance(data, dict):
+        raise InvalidRequest({"non_field_errors": ["Expected an object"]})
+    values, errors = field_errors(data)
+    if errors:
+        raise InvalidRequest(errors)
+    schema = request_schema(values)
+    point_errors = {}
+    for i, point in enumerate(points or ()):
+        errors = parameter_errors(schema, point)
+        if errors:
+            point_errors[str(i)] = errors
+    if point_errors:
+        raise InvalidRequest({"points": point_errors})
+
+
+def validate_comparison(data, variants):
+    """validate_simulation_request for every model of a comparison, with
+    the errors under ``{"models": {"<index>": ...}}``."""
+    model_errors = {}
+    for i, variant in enumerate(variants):
+        try:
+            validate_simulation_request({**data, **variant})
+        except InvalidRequest as e:
+            model_errors[str(i)] = e.errors
+    if model_errors:
+        raise InvalidRequest({"models": model_errors})
@@ -0,0 +1,62 @@
+import pybamm
+from django.conf import settings
+
+SOLVERS = ("default", "casadi", "idaklu")
+CASADI_MODES = ("fast", "safe", "fast with events")
+
+
+def resolve_solver_options(options=None):
+    """Merge request solver options over the server defaults and validate them."""
+    resolved = {
+        "name": "default",
+        "mode": "safe",
+        "rtol": None,
+        "atol": None,
+        "output_points": None,
+    }
+    resolved.update(getattr(settings, "SIMULATION_SOLVER", {}))
+    if options:
+        if not isinstance(options, dict):
+            raise ValueError("Solver options must be an object")
+        unknown = set(options) - set(resolved)
+        if unknown:
+            raise ValueError(f"Unknown solver options: {', '.join(sorted(unknown))}")
+        resolved.update(options)
+
+    if resolved["name"] not in SOLVERS:
+        raise ValueError(f"Unsupported solver: {resolved['name']}")
+    if resolved["mode"] not in CASADI_MODES:
+        raise ValueError(f"Unsupported solver mode: {resolved['mode']}")
+    for tol in ("rtol", "atol"):
+        if resolved[tol] is not None:
+            try:
+                resolved[tol] = float(resolved[tol])
+            except (TypeError, ValueError):
+                raise ValueError(f"{tol} must be a number")
+            if not 0 < resolved[tol] < 1:
+                raise ValueError(f"{tol} must be between 0 and 1")
+    if resolved["output_points"] is not None:
+        try:
+            resolved["output_points"] = int(resolved["output_points"])
+        except (TypeError, ValueError):
+            raise ValueError("output_points must be an integer")
+        if not 2 <= resolved["output_points"] <= 100000:
+            raise ValueError("output_points must be between 2 and 100000")
+    return resolved
+
+
+def make_solver(options, model, output_variables=None):
+    tolerances = {k: options[k] for k in ("rtol", "atol") if options[k] is not None}
+    if options["name"] == "casadi":
+        return pybamm.CasadiSolver(mode=options["mode"], **tolerances)
+    solver_class = (
+        pybamm.IDAKLUSolver if options["name"] == "idaklu" else type(model.default_solver)
+    )
+    kwargs = dict(tolerances)
+    if output_variables and issubclass(solver_class, pybamm.IDAKLUSolver):
+        # IDAKLU then stores just these variables instead of the full state vector
+        kwargs["output_variables"] = list(output_variables)
+    if options["name"] == "idaklu" or kwargs:
+        return solver_class(**kwargs)
+    # The model's own default solver
+    return None
@@ -0,0 +1,65 @@
+import os
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import SimulationRun
+from .pybamm_runner import get_duration
+
+
+def results_dir():
+    return Path(getattr(settings, "SIMULATION_RESULTS_DIR", settings.BASE_DIR / "results"))
+
+
+def series_path(key):
+    # Content addressed by the result cache key, identical runs share a file
+    return f"{key[:2]}/{key}.npz"
+
+
+def has_series(path):
+    return (results_dir() / path).exists()
+
+
+def save_series(path, series):
+    full_path = results_dir() / path
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so readers never see a half-written file
+    tmp_path = full_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **{name: np.asarray(v) for name, v in series.items()})
+    os.replace(tmp_path, full_path)
+
+
+def describe_series(path):
+    with np.load(results_dir() / path) as data:
+        return list(data.files), len(data["Time [s]"])
+
+
+def load_variables(path, names):
+    # npz members are decompressed on access, so only the requested ones are read
+    with np.load(results_dir() / path) as data:
+        missing = [name for name in names if name not in data.files]
+        if missing:
+            raise KeyError(", ".join(missing))
+        return {name: data[name] for name in names}
+
+
+def record_run(user, data, key, result):
+    path = series_path(key)
+    variables, n_points = describe_series(path)
+    return SimulationRun.objects.create(
+        user=user,
+        battery_type=data.get("battery_type"),
+        model_name=data.get("selected_model"),
+        parameters=data.get("params", {}),
+        duration=get_duration(data.get("params", {})),
+        termination=result.get("termination") or "",
+        data_path=path,
+        variables=variables,
+        n_points=n_points,
+    )
+
+
+def should_persist(data):
+    return bool(data.get("save", getattr(settings, "SIMULATION_PERSIST_RUNS", True)))
@@ -0,0 +1,380 @@
+import atexit
+import inspect
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .memory import current_rss
+
+logger = logging.getLogger(__name__)
+
+# CPU seconds used by supervised children on behalf of each calling thread
+_consumed = threading.local()
+
+# Model cache counters, which keep counting across replaced workers
+CACHE_COUNTERS = ("hits", "misses", "evictions")
+
+
+def process_cpu_seconds(pid):
+    # User plus system time of a process, 0 where /proc is unavailable
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def consumed_cpu():
+    """CPU seconds supervised runs have used for the current thread so far."""
+    return getattr(_consumed, "seconds", 0.0)
+
+
+class SimulationAborted(Exception):
+    """A supervised run was killed, or never got a worker. ``code`` is
+    "timeout", "memory_limit", "crashed" or "busy" and ``limit`` the limit
+    it broke, if any."""
+
+    def __init__(self, message, code, limit=None):
+        super().__init__(message)
+        self.code = code
+        self.limit = limit
+
+
+def worker_main(conn):
+    # Child process loop: run (func, args, kwargs) tasks until the pipe closes
+    from .jobs import init_worker
+    from .pybamm_runner import model_cache
+
+    init_worker()
+    try:
+        conn.send(("ready", None))
+    except OSError:
+        # The pool shut down while this worker was starting
+        return
+    while True:
+        try:
+            func, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            value = func(*args, **kwargs)
+            if inspect.isgenerator(value):
+                for item in value:
+                    conn.send(("item", item))
+                conn.send(("stats", model_cache.stats()))
+                conn.send(("done", None))
+            else:
+                conn.send(("stats", model_cache.stats()))
+                conn.send(("result", value))
+        except Exception as e:
+            conn.send(("stats", model_cache.stats()))
+            try:
+                conn.send(("error", e))
+            except Exception:
+                # Unpicklable exception, keep the message
+                conn.send(("error", RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        # Not a daemon so runs can still use the batch process pool
+        self.process = context.Process(target=worker_main, args=(child_conn,), daemon=False)
+        self.process.start()
+        child_conn.close()
+        # Set once the child has set up Django and warmed up
+        self.ready = False
+        self.tasks = 0
+        # The child's model cache stats as of its last finished run
+        self.cache_stats = {}
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+
+class SupervisedPool:
+    """Child processes that run simulations under wall-clock and RSS limits.
+
+    Workers are started by start(), or on demand, up to ``size`` and
+    reused, so a warm child keeps its model cache between runs. A run that
+    goes past ``timeout`` seconds or ``max_rss`` bytes has its worker killed
+    and raises SimulationAborted, as does waiting longer than ``timeout``
+    for a free worker. Workers are also replaced after ``max_tasks`` runs
+    (0 for never) to bound leaks. A replacement starts right away, so it
+    has warmed up before the next run needs it.
+    """
+
+    def __init__(
+        self,
+        size,
+        timeout=120,
+        max_rss=2048 * 1024 * 1024,
+        max_tasks=100,
+        interval=0.1,
+        startup_timeout=300,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.max_rss = max_rss
+        self.max_tasks = max_tasks
+        self.interval = interval
+        self._context = multiprocessing.get_context("spawn")
+        self._condition = threading.Condition()
+        self._idle = []  # Most recently used last, it has the warmest cache
+        self._started = 0
+        self._workers = set()
+        self._retired_stats = dict.fromkeys(CACHE_COUNTERS, 0)
+        self._closed = False
+
+    def start(self, count=None):
+        """Start ``count`` more workers (all of them by default) in the
+        background, ready for runs once they have warmed up."""
+        for _ in range(self.size if count is None else count):
+            with self._condition:
+                if self._closed or self._started >= self.size:
+                    return
+                self._started += 1
+            try:
+                worker = Worker(self._context)
+            except Exception:
+                logger.exception("Couldn't start a simulation worker")
+                self._retire()
+                return
+            with self._condition:
+                self._workers.add(worker)
+                # Cold, so the warm ones are picked first
+                self._idle.insert(0, worker)
+                self._condition.notify()
+
+    def _acquire(self):
+        # Waiting for a worker counts against the same limit as a run
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while not self._idle and self._started >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SimulationAborted(
+                        "No simulation worker became free in time", "busy", self.timeout
+                    )
+                self._condition.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+        try:
+            worker = Worker(self._context)
+        except Exception:
+            self._retire()
+            raise
+        with self._condition:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker=None):
+        with self._condition:
+            self._started -= 1
+            if worker is not None:
+                self._workers.discard(worker)
+                for name in CACHE_COUNTERS:
+                    self._retired_stats[name] += worker.cache_stats.get(name, 0)
+            self._condition.notify()
+
+    def _release(self, worker, healthy):
+        worker.tasks += 1
+        if healthy and (not self.max_tasks or worker.tasks < self.max_tasks):
+            with self._condition:
+                self._idle.append(worker)
+                self._condition.notify()
+            return
+        worker.kill()
+        self._retire(worker)
+        self.start(1)
+
+    def _wait_ready(self, worker):
+        # Django setup and warm-up don't count against the run's limits
+        deadline = time.monotonic() + self.startup_timeout
+        while not worker.conn.poll(self.interval):
+            if not worker.process.is_alive() or time.monotonic() > deadline:
+                raise SimulationAborted("Simulation process failed to start", "crashed")
+        try:
+            worker.conn.recv()
+        except (EOFError, OSError):
+            raise SimulationAborted("Simulation process failed to start", "crashed")
+        worker.ready = True
+
+    def _receive(self, worker, deadline):
+        # Wait for the next message, policing the child while it works
+        while not worker.conn.poll(self.interval):
+            if not worker.process.is_alive():
+                raise SimulationAborted(
+                    f"Simulation process exited with code {worker.process.exitcode}",
+                    "crashed",
+                )
+            if time.monotonic() > deadline:
+                raise SimulationAborted(
+                    f"Simulation exceeded the {self.timeout:g}s time limit",
+                    "timeout",
+                    self.timeout,
+                )
+            rss = current_rss(worker.process.pid)
+            if self.max_rss and rss > self.max_rss:
+                raise SimulationAborted(
+                    f"Simulation exceeded the {self.max_rss // 2**20} MB memory limit",
+                    "memory_limit",
+                    self.max_rss,
+                )
+        try:
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            raise SimulationAborted("Simulation process exited unexpectedly", "crashed")
+
+    def iterate(self, func, *args, **kwargs):
+        """Run ``func`` in a worker, yielding its messages as (kind, value).
+
+        Closing the generator before the run ends kills the worker, which
+        is how a streamed run is stopped.
+        """
+        worker = self._acquire()
+        healthy = False
+        try:
+            if not worker.ready:
+                self._wait_ready(worker)
+            deadline = time.monotonic() + self.timeout
+            cpu = process_cpu_seconds(worker.process.pid)
+            worker.conn.send((func, args, kwargs))
+            while True:
+                try:
+                    kind, value = self._receive(worker, deadline)
+                finally:
+                    now = process_cpu_seconds(worker.process.pid)
+                    _consumed.seconds = consumed_cpu() + max(now - cpu, 0)
+                    cpu = now
+                if kind == "stats":
+                    worker.cache_stats = value
+                    continue
+                if kind in ("result", "done", "error"):
+                    healthy = True
+                if kind == "error":
+                    raise value
+                yield kind, value
+                if kind != "item":
+                    return
+        except SimulationAborted as e:
+            logger.warning("Killed simulation worker %s: %s", worker.process.pid, e)
+            raise
+        finally:
+            self._release(worker, healthy)
+
+    def run(self, func, *args, **kwargs):
+        for _, value in self.iterate(func, *args, **kwargs):
+            return value
+
+    def stream(self, func, *args, **kwargs):
+        for kind, value in self.iterate(func, *args, **kwargs):
+            if kind == "item":
+                yield value
+
+    def cache_stats(self):
+        """Model cache stats summed over the workers. Counters include the
+        workers already replaced, as of their last finished run."""
+        with self._condition:
+            stats = {"entries": 0, "bytes": 0, **self._retired_stats}
+            for worker in self._workers:
+                for name, value in worker.cache_stats.items():
+                    stats[name] = stats.get(name, 0) + value
+        return stats
+
+    def shutdown(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.kill()
+            self._retire(worker)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_supervised_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SupervisedPool(
+                size=getattr(settings, "SIMULATION_MAX_CONCURRENT", None) or os.cpu_count() or 2,
+                timeout=getattr(settings, "SIMULATION_TIMEOUT", 120),
+                max_rss=getattr(settings, "SIMULATION_MAX_RSS_MB", 2048) * 1024 * 1024,
+                max_tasks=getattr(settings, "SIMULATION_WORKER_MAX_TASKS", 100),
+            )
+            # Idle workers wait for tasks, multiprocessing would join them forever
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def isolated():
+    # Pool and job workers already are child processes, run inline there
+    return (
+        getattr(settings, "SIMULATION_ISOLATE", False)
+        and multiprocessing.parent_process() is None
+    )
+
+
+def run_supervised(func, *args, **kwargs):
+    """Call ``func`` in a supervised worker when SIMULATION_ISOLATE is on,
+    inline otherwise. ``func`` and its arguments must be picklable."""
+    if not isolated():
+        return func(*args, **kwargs)
+    return get_supervised_pool().run(func, *args, **kwargs)
+
+
+def map_supervised(func, calls, timeout=None):
+    """Call ``func(*args)`` for every tuple in ``calls`` concurrently, each in
+    its own supervised worker, and return the results in order. At most
+    SIMULATION_REQUEST_MAX_WORKERS calls run at once, so one request can't
+    take over the pool. If a call fails or is aborted, calls not yet started
+    are cancelled and the error is raised once the running ones have finished.
+
+    With a ``timeout`` the calls get workers of their own, all at once and
+    each under that time limit instead of SIMULATION_TIMEOUT. That's for
+    offline work such as surrogate training, which isn't a request.
+    """
+    if timeout is None:
+        pool = get_supervised_pool()
+        limit = max(getattr(settings, "SIMULATION_REQUEST_MAX_WORKERS", 2), 1)
+        workers = min(len(calls), pool.size, limit)
+    else:
+        pool = SupervisedPool(
+            size=len(calls),
+            timeout=timeout,
+            max_rss=getattr(settings, "SIMULATION_MAX_RSS_MB", 2048) * 1024 * 1024,
+            max_tasks=0,
+        )
+        workers = len(calls)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(pool.run, func, *args) for args in calls]
+            try:
+                return [future.result() for future in futures]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        if pool is not _pool:
+            pool.shutdown()
+
+
+def stream_supervised(func, *args, **kwargs):
+    """Like run_supervised for generator functions, yielding their items."""
+    if not isolated():
+        return func(*args, **kwargs)
+    return get_supervised_pool().stream(func, *args, **kwargs)
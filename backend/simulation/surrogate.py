@@ -0,0 +1,328 @@
+import itertools
+import json
+import threading
+import time
+
+import numpy as np
+import pybamm
+from django.conf import settings
+
+from .batch import run_batch
+from .parameter_sets import get_parameter_values, resolve_parameter_set
+from .pybamm_runner import filter_params, get_duration, get_model_class
+from .storage import results_dir
+
+# Inputs a surrogate is trained over when the command isn't given --param
+DEFAULT_RANGES = {
+    "lithium-ion": {
+        "Current function [A]": (1.0, 7.5),
+        "Negative electrode porosity": (0.2, 0.4),
+        "Positive electrode porosity": (0.2, 0.4),
+        "Ambient temperature [K]": (278.15, 318.15),
+    },
+}
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def surrogate_dir():
+    return getattr(settings, "SIMULATION_SURROGATE_DIR", results_dir() / "surrogates")
+
+
+def surrogate_path(battery_type, selected_model):
+    return surrogate_dir() / f"{battery_type}_{selected_model}.npz"
+
+
+def monomials(n_inputs, degree):
+    # Exponent index tuples for every monomial up to ``degree``, constant first
+    return [
+        combo
+        for d in range(degree + 1)
+        for combo in itertools.combinations_with_replacement(range(n_inputs), d)
+    ]
+
+
+def features(z, terms):
+    columns = [np.prod(z[:, list(term)], axis=1) if term else np.ones(len(z)) for term in terms]
+    return np.column_stack(columns)
+
+
+def normalize_curves(time_grid, voltage, points):
+    """Resample each run onto ``points`` fractions of its own end time.
+
+    Runs stop at different times when they hit a cut-off, and on a shared
+    time grid that knee moves around; against the fraction of the run it
+    stays put, which PCA captures with far fewer components. Returns
+    (curves, end times, mask of usable runs).
+    """
+    voltage = np.array(voltage, dtype=float)
+    ends = (~np.isnan(voltage)).sum(axis=1)
+    keep = ends > 1
+    fractions = np.linspace(0, 1, points)
+    t_end = time_grid[ends[keep] - 1]
+    curves = np.array(
+        [
+            np.interp(fractions * end, time_grid[:n], row[:n])
+            for row, n, end in zip(voltage[keep], ends[keep], t_end)
+        ]
+    )
+    return curves, t_end, keep
+
+
+class Surrogate:
+    """PCA of voltage curves with a polynomial ridge regression on top.
+
+    Inputs are scaled to [-1, 1] over their training ranges. The regression
+    predicts the principal component scores of the curve against the
+    fraction of the run (see normalize_curves) and the time the run stops,
+    so a query is one small matrix product.
+    """
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.names = meta["names"]
+        self.terms = [tuple(term) for term in meta["terms"]]
+        self.lows = arrays["lows"]
+        self.highs = arrays["highs"]
+        self.fractions = arrays["fractions"]
+        self.mean = arrays["mean"]
+        self.components = arrays["components"]
+        self.weights = arrays["weights"]
+        self.validation_inputs = arrays["validation_inputs"]
+        self.validation_errors = arrays["validation_errors"]
+
+    def scale(self, values):
+        return 2 * (values - self.lows) / (self.highs - self.lows) - 1
+
+    def predict_scaled(self, z):
+        out = features(np.atleast_2d(z), self.terms) @ self.weights
+        curves = self.mean + out[:, :-1] @ self.components
+        return curves, out[:, -1]
+
+    def predict(self, values):
+        """Return (time, voltage, error_estimate, extrapolated) for one query."""
+        z = self.scale(np.array([values[name] for name in self.names], dtype=float))
+        extrapolated = bool(np.any(np.abs(z) > 1))
+        # Polynomials diverge outside the sampled box, answer from its edge
+        z = np.clip(z, -1, 1)
+        curves, t_end = self.predict_scaled(z)
+        t = self.fractions * max(float(t_end[0]), 1.0)
+        # Error of the nearest held-out runs stands in for the local error
+        distance = np.linalg.norm(self.validation_inputs - z, axis=1)
+        nearest = np.argsort(distance)[:5]
+        return (
+            t,
+            curves[0],
+            float(self.validation_errors[nearest].mean()),
+            extrapolated,
+        )
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            meta=np.array(json.dumps(self.meta)),
+            lows=self.lows,
+            highs=self.highs,
+            fractions=self.fractions,
+            mean=self.mean,
+            components=self.components,
+            weights=self.weights,
+            validation_inputs=self.validation_inputs,
+            validation_errors=self.validation_errors,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(arrays, json.loads(str(arrays.pop("meta"))))
+
+
+def sample_runs(battery_type, selected_model, ranges, samples, duration, points, seed, processes=1):
+    """Latin hypercube samples over ``ranges`` solved through the batch runner,
+    each chunk of points under SIMULATION_SURROGATE_TIMEOUT rather than the
+    time limit of a request."""
+    from scipy.stats import qmc
+
+    names = list(ranges)
+    lows = np.array([ranges[name][0] for name in names], dtype=float)
+    highs = np.array([ranges[name][1] for name in names], dtype=float)
+    unit = qmc.LatinHypercube(d=len(names), seed=seed).random(samples)
+    inputs = qmc.scale(unit, lows, highs)
+
+    chunk = getattr(settings, "SIMULATION_BATCH_MAX_POINTS", 500)
+    voltage = []
+    for start in range(0, samples, chunk):
+        result = run_batch(
+            {
+                "battery_type": battery_type,
+                "selected_model": selected_model,
+                "params": {"duration": duration},
+                "points": [dict(zip(names, row)) for row in inputs[start:start + chunk]],
+                "output_points": points,
+                "processes": processes,
+            },
+            timeout=getattr(settings, "SIMULATION_SURROGATE_TIMEOUT", 3600),
+        )
+        voltage.extend(
+            [np.nan if v is None else v for v in curve] for curve in result["voltage"]
+        )
+        time_grid = np.array(result["time"])
+    return names, lows, highs, inputs, time_grid, np.array(voltage, dtype=float)
+
+
+def train_surrogate(
+    battery_type,
+    selected_model,
+    ranges=None,
+    samples=200,
+    duration=3600,
+    points=100,
+    degree=3,
+    seed=0,
+    processes=1,
+    ridge=1e-6,
+    validation=0.2,
+):
+    """Train and save a surrogate, returning it with its validation metrics.
+
+    The same arguments and seed give the same samples, split and weights.
+    """
+    get_model_class(battery_type, selected_model)
+    ranges = ranges or DEFAULT_RANGES.get(battery_type)
+    if not ranges:
+        raise ValueError(f"No default parameter ranges for {battery_type}, pass them explicitly")
+
+    started = time.perf_counter()
+    # Solved on a finer grid than the surrogate keeps so end times are sharp
+    names, lows, highs, inputs, time_grid, voltage = sample_runs(
+        battery_type, selected_model, ranges, samples, duration, 10 * points, seed, processes
+    )
+    voltage, t_end, keep = normalize_curves(time_grid, voltage, points)
+    z = 2 * (inputs[keep] - lows) / (highs - lows) - 1
+
+    order = np.random.default_rng(seed).permutation(len(z))
+    n_validation = max(1, int(len(z) * validation))
+    held_out, train = order[:n_validation], order[n_validation:]
+
+    mean = voltage[train].mean(axis=0)
+    _, s, vt = np.linalg.svd(voltage[train] - mean, full_matrices=False)
+    energy = np.cumsum(s**2) / np.sum(s**2)
+    k = min(int(np.searchsorted(energy, 1 - 1e-6)) + 1, 12)
+    components = vt[:k]
+    scores = (voltage[train] - mean) @ components.T
+
+    terms = monomials(len(names), degree)
+    phi = features(z[train], terms)
+    targets = np.column_stack([scores, t_end[train]])
+    weights = np.linalg.solve(phi.T @ phi + ridge * np.eye(len(terms)), phi.T @ targets)
+
+    meta = {
+        "battery_type": battery_type,
+        "selected_model": selected_model,
+        "parameter_set": resolve_parameter_set(battery_type, selected_model),
+        "names": names,
+        "terms": [list(term) for term in terms],
+        "samples": int(len(z)),
+        "degree": degree,
+        "seed": seed,
+        "duration": duration,
+        "pybamm_version": pybamm.__version__,
+    }
+    arrays = {
+        "lows": lows,
+        "highs": highs,
+        "fractions": np.linspace(0, 1, points),
+        "mean": mean,
+        "components": components,
+        "weights": weights,
+        "validation_inputs": z[held_out],
+        "validation_errors": np.zeros(len(held_out)),
+    }
+    surrogate = Surrogate(arrays, meta)
+
+    curves, _ = surrogate.predict_scaled(z[held_out])
+    errors = np.sqrt(np.mean((curves - voltage[held_out]) ** 2, axis=1))
+    surrogate.validation_errors = errors
+    surrogate.meta["validation"] = {
+        "rmse": float(np.sqrt(np.mean(errors**2))),
+        "max_rmse": float(errors.max()),
+        "runs": int(len(held_out)),
+        "components": k,
+        "training_seconds": time.perf_counter() - started,
+    }
+    surrogate.save(surrogate_path(battery_type, selected_model))
+    return surrogate
+
+
+def get_surrogate(battery_type, selected_model):
+    """Load a trained surrogate once per process, None if there isn't one."""
+    path = surrogate_path(battery_type, selected_model)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, Surrogate.load(path))
+            _loaded[path] = cached
+        return cached[1]
+
+
+def differs(default, value):
+    # Function-valued defaults can't be compared, so any override counts
+    if not isinstance(default, (int, float)):
+        return True
+    return not np.isclose(float(value), default)
+
+
+def preview(data):
+    """Answer a simulate payload from the surrogate.
+
+    Request parameters the surrogate wasn't trained on are listed under
+    ``ignored_parameters`` when they differ from the parameter set, and the
+    UI can confirm those with a full solve.
+    """
+    started = time.perf_counter()
+    battery_type = data.get("battery_type")
+    selected_model = data.get("selected_model")
+    get_model_class(battery_type, selected_model)
+    if data.get("experiment") is not None:
+        raise ValueError("Previews cover constant current runs, simulate experiments in full")
+    surrogate = get_surrogate(battery_type, selected_model)
+    parameter_set = resolve_parameter_set(battery_type, selected_model, data.get("parameter_set"))
+    # Surrogates are trained on one set, others need a full simulation
+    if surrogate is None or surrogate.meta["parameter_set"] != parameter_set:
+        return None
+
+    param = get_parameter_values(battery_type, selected_model, parameter_set)
+    params_from_request = data.get("params", {})
+    requested = filter_params(param, params_from_request)
+    values = {
+        name: float(requested[name]) if name in requested else float(param[name])
+        for name in surrogate.names
+    }
+    ignored = sorted(
+        name
+        for name, value in requested.items()
+        if name not in values and differs(param[name], value)
+    )
+
+    t, voltage, error, extrapolated = surrogate.predict(values)
+    duration = get_duration(params_from_request)
+    keep = t <= duration
+    return {
+        "status": "success",
+        "summary": "Surrogate preview",
+        "surrogate": True,
+        "time": t[keep].tolist(),
+        "voltage": voltage[keep].tolist(),
+        "error_estimate": error,
+        "extrapolated": extrapolated or duration > surrogate.meta["duration"],
+        "ignored_parameters": ignored,
+        "validation": surrogate.meta["validation"],
+        "elapsed_ms": (time.perf_counter() - started) * 1000,
+    }
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from .jobs import execute_job
+
+
+@shared_task
+def run_simulation_job(job_id):
+    execute_job(job_id)
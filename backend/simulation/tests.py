@@ -1,3 +1,108 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .admission import Overloaded, Scheduler, scheduler
+from .models import APIUsage
+
+SPM = {"battery_type": "lithium-ion", "selected_model": "SPM", "save": False}
+
+# Solve in-process against a private result cache, so the tests neither
+# start worker processes nor see results left by earlier runs
+TEST_SETTINGS = {
+    "SIMULATION_ISOLATE": False,
+    "CACHES": {
+        **settings.CACHES,
+        "simulation_results": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "simulation-tests",
+        },
+    },
+}
+
+
+class SimulationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("tester", password="unused")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+@override_settings(**TEST_SETTINGS)
+class ValidationTests(SimulationTestCase):
+    def test_out_of_bounds_parameter(self):
+        response = self.client.post(
+            "/api/simulate/",
+            {**SPM, "params": {"Negative electrode porosity": 1.5}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Negative electrode porosity", response.json()["fields"]["params"])
+        # Rejected before admission, so nothing is metered
+        self.assertFalse(APIUsage.objects.exists())
+
+    def test_unknown_solver(self):
+        response = self.client.post(
+            "/api/simulate/", {**SPM, "solver": {"name": "bogus"}}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("solver", response.json()["fields"])
+
+    def test_unknown_variable(self):
+        response = self.client.post(
+            "/api/simulate/", {**SPM, "variables": ["Not a variable"]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("variables", response.json()["fields"])
+
+
+@override_settings(**TEST_SETTINGS)
+class ResultCacheTests(SimulationTestCase):
+    def test_miss_then_hit(self):
+        body = {**SPM, "params": {"C-rate": 0.77}}
+        first = self.client.post("/api/simulate/", body, format="json")
+        second = self.client.post("/api/simulate/", body, format="json")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["X-Sim-Cache"], "miss")
+        self.assertEqual(second["X-Sim-Cache"], "hit")
+        self.assertEqual(first["X-Sim-Cache-Key"], second["X-Sim-Cache-Key"])
+        self.assertEqual(first.json()["series"], second.json()["series"])
+
+    def test_nocache_bypasses(self):
+        body = {**SPM, "params": {"C-rate": 0.78}, "nocache": True}
+        response = self.client.post("/api/simulate/", body, format="json")
+        self.assertEqual(response["X-Sim-Cache"], "bypass")
+
+
+@override_settings(**TEST_SETTINGS)
+class AdmissionTests(SimulationTestCase):
+    def test_success_is_metered_and_released(self):
+        body = {**SPM, "params": {"C-rate": 0.79}, "nocache": True}
+        response = self.client.post("/api/simulate/", body, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(scheduler.running(), 0)
+        usage = APIUsage.objects.get(user=self.user)
+        self.assertEqual(usage.status_code, 200)
+        self.assertGreater(usage.estimated_cost, 0)
+
+    def test_failed_stream_releases_its_slot(self):
+        # The cut-off is above the starting voltage, so the first solve fails
+        body = {**SPM, "params": {"Lower voltage cut-off [V]": 4.3}}
+        for _ in range(3):
+            response = self.client.post("/api/simulate/stream/", body, format="json")
+            self.assertEqual(response.status_code, 500)
+            self.assertEqual(scheduler.running(), 0)
+        self.assertEqual(
+            list(APIUsage.objects.values_list("status_code", flat=True)), [500, 500, 500]
+        )
+
+    def test_scheduler_times_out_when_full(self):
+        slots = Scheduler(capacity=1, per_user=1, timeout=0.05)
+        handle = slots.acquire(1, 1.0)
+        with self.assertRaises(Overloaded) as raised:
+            slots.acquire(2, 1.0)
+        self.assertGreater(raised.exception.retry_after, 0)
+        slots.release(handle)
+        slots.release(slots.acquire(2, 1.0))
+        self.assertEqual(slots.running(), 0)
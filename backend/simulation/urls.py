@@ -1,8 +1,23 @@
 from django.urls import path
-from .views import SimulateView, RegisterView, LoginView,ChatbotView, RequestPasswordResetView
+from .views import SimulateView, MetricsView, ParameterSetsView, SimulatePreviewView, RegisterView, LoginView,ChatbotView, RequestPasswordResetView, JobDetailView, JobResultView, BatchSimulateView, CompareView, CyclingView, FittingView, SensitivityView, JobEventsView, SimulateStreamView, RunListView, RunDetailView, RunVariablesView
 
 urlpatterns = [
     path('simulate/', SimulateView.as_view(), name='simulate'),
+    path('simulate/stream/', SimulateStreamView.as_view(), name='simulate_stream'),
+    path('simulate/preview/', SimulatePreviewView.as_view(), name='simulate_preview'),
+    path('simulate/batch/', BatchSimulateView.as_view(), name='simulate_batch'),
+    path('simulate/compare/', CompareView.as_view(), name='simulate_compare'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('parameter-sets/', ParameterSetsView.as_view(), name='parameter_sets'),
+    path('sensitivity/', SensitivityView.as_view(), name='sensitivity'),
+    path('fitting/', FittingView.as_view(), name='fitting'),
+    path('cycling/', CyclingView.as_view(), name='cycling'),
+    path('jobs/<uuid:job_id>/', JobDetailView.as_view(), name='job_detail'),
+    path('jobs/<uuid:job_id>/result/', JobResultView.as_view(), name='job_result'),
+    path('jobs/<uuid:job_id>/events/', JobEventsView.as_view(), name='job_events'),
+    path('runs/', RunListView.as_view(), name='run_list'),
+    path('runs/<int:pk>/', RunDetailView.as_view(), name='run_detail'),
+    path('runs/<int:pk>/variables/', RunVariablesView.as_view(), name='run_variables'),
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('chat/', ChatbotView.as_view(), name='chatbot'),
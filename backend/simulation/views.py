@@ -1,11 +1,48 @@
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework.decorators import api_view, permission_classes
-from .pybamm_runner import run_simulation
+from .pybamm_runner import stream_simulation
+from .renderers import SERIES_RENDERERS, EventStreamRenderer, format_event
+from .jobs import submit_job
+from .batch import expand_points, run_batch
+from .compare import parse_variants, run_comparison
+from .cycling import parse_cycling
+from .sensitivity import run_sensitivity
+from .fitting import parse_fitting
+from .surrogate import preview
+from .parameter_sets import catalog, catalog_etag
+from . import metrics
+from .result_cache import is_cached, run_cached
+from .supervisor import SimulationAborted, run_supervised, stream_supervised
+from .admission import (
+    Admission,
+    Overloaded,
+    admitted,
+    admitted_stream,
+    is_asgi,
+    check_active_jobs,
+    check_quota,
+    estimate_cost,
+    estimate_job_cost,
+    reserve_job,
+)
+from .storage import load_variables, record_run, should_persist
+from .serializers import (
+    InvalidRequest,
+    SimulationRunSerializer,
+    parse_max_points,
+    validate_comparison,
+    validate_simulation_request,
+)
+from .models import SimulationJob, SimulationRun
+from .pybamm_runner import downsample, encode_series
 from .aihelper import answer_query
+from .chat import build_messages, complete, stream_tokens
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status, permissions
+from rest_framework.renderers import JSONRenderer
+from rest_framework import generics, status, permissions
+from rest_framework.pagination import PageNumberPagination
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.hashers import make_password
 import openai
@@ -16,10 +53,12 @@ from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse
 from django.utils.decorators import method_decorator
 from django.views import View
-from openai import OpenAI
 from openai import AuthenticationError, RateLimitError, OpenAIError
+import asyncio
 import time
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import transaction
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import User
 from django.contrib import messages
@@ -40,22 +79,517 @@ User = get_user_model()
 
 
 logger = logging.getLogger(__name__)
-os.getenv("api_key")
+
+
+def get_payload(request):
+    # CSV uploads are multipart: the files plus the JSON body in "payload"
+    if not request.FILES:
+        return request.data
+    data = json.loads(request.data.get("payload") or "{}")
+    if "drive_cycle" in request.FILES:
+        experiment = data.get("experiment") or {}
+        if isinstance(experiment, list):
+            experiment = {"steps": experiment}
+        csv = request.FILES["drive_cycle"].read().decode("utf-8-sig")
+        data["experiment"] = {**experiment, "drive_cycle": csv}
+    if "measurements" in request.FILES:
+        data["measurements"] = request.FILES["measurements"].read().decode("utf-8-sig")
+    return data
+
+
+def bad_request(e):
+    body = {"error": str(e)}
+    if isinstance(e, InvalidRequest):
+        body["fields"] = e.errors
+    return Response(body, status=status.HTTP_400_BAD_REQUEST)
+
+
+def overloaded_response(e):
+    metrics.rejections.inc(e.reason)
+    if e.retry_after is None:
+        # Retrying can't help, so this is the client's error
+        return Response({"error": str(e), "code": e.reason}, status=status.HTTP_400_BAD_REQUEST)
+    response = Response(
+        {"error": str(e), "retry_after": e.retry_after},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+    )
+    response["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def aborted_response(e):
+    # Killed for running too long is a timeout, anything else a 503
+    metrics.aborted.inc(e.code)
+    return Response(
+        {"error": str(e), "code": e.code, "limit": e.limit},
+        status=(
+            status.HTTP_504_GATEWAY_TIMEOUT
+            if e.code == "timeout"
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+    )
+
+
+def submit_metered_job(request, kind, data):
+    # Jobs queue in the worker pool. Their estimate is reserved against the
+    # quota now, and pending jobs count against the user's concurrency.
+    cost = estimate_job_cost(kind, data)
+    with transaction.atomic():
+        # One submission per user at a time, so the checks see each other's jobs
+        User.objects.select_for_update().get(pk=request.user.pk)
+        check_active_jobs(request.user)
+        check_quota(request.user, cost)
+        job = SimulationJob.objects.create(user=request.user, kind=kind, request=data)
+        reserve_job(job, cost, request)
+        submit_job(job)
+    return Response(job_payload(job), status=status.HTTP_202_ACCEPTED)
+
 
 class SimulateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = SERIES_RENDERERS
+
+    def post(self, request):
+        try:
+            data = get_payload(request)
+            validate_simulation_request(data)
+        except (ValueError, UnicodeDecodeError) as e:
+            return bad_request(e)
+        if data.get("async"):
+            try:
+                return submit_metered_job(request, "simulate", data)
+            except ValueError as e:
+                return bad_request(e)
+            except Overloaded as e:
+                return overloaded_response(e)
+        # ?nocache=1 (or "nocache": true) skips the result cache for debugging
+        bypass = bool(request.query_params.get("nocache") or data.get("nocache"))
+        labels = metrics.request_labels(data)
+        started = time.perf_counter()
+        try:
+            persist = should_persist(data)
+            # Cached answers cost nothing, so they skip the quota and queue
+            cost = 0 if not bypass and is_cached(data, persist) else None
+            with admitted(request, data, cost):
+                result, cache_status, key = run_cached(data, bypass=bypass, persist=persist)
+            if persist:
+                run = record_run(request.user, data, key, result)
+                result = {**result, "run_id": run.id}
+            metrics.requests.inc(*labels, cache_status)
+            response = Response(result)
+            response["X-Sim-Cache"] = cache_status
+            response["X-Sim-Cache-Key"] = key
+            # A hit's own timings belong to the run that filled the cache
+            response.sim_timings = (
+                {"cache": time.perf_counter() - started}
+                if cache_status == "hit"
+                else dict(result["timings"])
+            )
+            response.sim_labels = labels
+            response.sim_finished = time.perf_counter()
+            return response
+        except Overloaded as e:
+            return overloaded_response(e)
+        except SimulationAborted as e:
+            return aborted_response(e)
+        except ValueError as e:
+            # Solver, experiment and variable names are only checked when solving
+            return bad_request(e)
+        except Exception as e:
+            metrics.failures.inc(*labels)
+            logger.exception("Simulation failed")
+            return Response({"error": str(e)}, status=500)
+
+
+class MetricsView(APIView):
+    """Prometheus text exposition of this process's simulation metrics."""
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        token = getattr(settings, "SIMULATION_METRICS_TOKEN", "")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponse(status=401)
+        return HttpResponse(
+            metrics.render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+class ParameterSetsView(APIView):
+    """Parameter sets per chemistry with their keys and scalar values. The
+    catalog only changes with the code, so clients revalidate by ETag."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        etag = f'"{catalog_etag()}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(catalog())
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+class SimulatePreviewView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            validate_simulation_request(request.data)
+            result = preview(request.data)
+        except ValueError as e:
+            return bad_request(e)
+        if result is None:
+            return Response(
+                {"error": "No surrogate trained for this model, run a full simulation"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(result)
+
+
+class SimulateStreamView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request):
+        try:
+            data = get_payload(request)
+            validate_simulation_request(data)
+            admission = Admission(request, data)
+        except Overloaded as e:
+            return overloaded_response(e)
+        except (ValueError, UnicodeDecodeError) as e:
+            return bad_request(e)
+        labels = metrics.request_labels(data)
+        streaming = False
+        try:
+            events = stream_supervised(
+                stream_simulation,
+                data.get("battery_type"),
+                data.get("params", {}),
+                data.get("selected_model"),
+                var_pts=data.get("var_pts"),
+                chunks=data.get("chunks", 20),
+                max_points=data.get("max_points", 500),
+                solver=data.get("solver"),
+                experiment=data.get("experiment"),
+                parameter_set=data.get("parameter_set"),
+                metrics=data.get("metrics"),
+            )
+            # Run the first chunk eagerly so bad input still gets a plain 400
+            with admission.measure():
+                first = next(events)
+            streaming = True
+        except ValueError as e:
+            admission.status_code = 400
+            return bad_request(e)
+        except SimulationAborted as e:
+            admission.status_code = 503
+            return aborted_response(e)
+        except Exception as e:
+            admission.status_code = 500
+            metrics.failures.inc(*labels)
+            logger.exception("Streaming simulation failed")
+            return Response({"error": str(e)}, status=500)
+        finally:
+            # Until the stream takes the admission over, its slot is freed here
+            if not streaming:
+                admission.finish()
+
+        def stream():
+            try:
+                yield format_event(*first)
+                while True:
+                    with admission.measure():
+                        event = next(events, None)
+                    if event is None:
+                        break
+                    if event[0] == "result":
+                        metrics.record_simulation(*labels, event[1]["timings"])
+                    yield format_event(*event)
+            except SimulationAborted as e:
+                admission.status_code = 503
+                metrics.aborted.inc(e.code)
+                yield format_event("error", {"error": str(e), "code": e.code, "limit": e.limit})
+            except Exception as e:
+                admission.status_code = 500
+                metrics.failures.inc(*labels)
+                logger.exception("Streaming simulation failed")
+                yield format_event("error", {"error": str(e)})
+            finally:
+                # Client went away or run finished, stop stepping
+                events.close()
+
+        response = StreamingHttpResponse(
+            admitted_stream(stream(), admission), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class CyclingView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        # Cycle ageing always runs as a background job, checkpointed as it goes
+        data = {"battery_type": "lithium-ion", "selected_model": "SPM", **request.data}
+        try:
+            validate_simulation_request(data)
+            parse_cycling(data)
+            return submit_metered_job(request, "cycling", data)
+        except ValueError as e:
+            return bad_request(e)
+        except Overloaded as e:
+            return overloaded_response(e)
+
+
+class FittingView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        # Fits run as background jobs, best-so-far values land in job progress
+        try:
+            data = get_payload(request)
+            validate_simulation_request(data)
+            parse_fitting(data)
+            return submit_metered_job(request, "fitting", data)
+        except (ValueError, UnicodeDecodeError) as e:
+            return bad_request(e)
+        except Overloaded as e:
+            return overloaded_response(e)
+
+
+class SensitivityView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            validate_simulation_request(request.data)
+            # One solve carrying a sensitivity per parameter
+            cost = estimate_cost(request.data) * (1 + len(request.data.get("parameters") or []))
+            with admitted(request, request.data, cost):
+                return Response(run_supervised(run_sensitivity, request.data))
+        except ValueError as e:
+            return bad_request(e)
+        except Overloaded as e:
+            return overloaded_response(e)
+        except SimulationAborted as e:
+            return aborted_response(e)
+        except Exception as e:
+            metrics.failures.inc(*metrics.request_labels(request.data))
+            logger.exception("Sensitivity analysis failed")
+            return Response({"error": str(e)}, status=500)
+
+
+class BatchSimulateView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            points = expand_points(request.data.get("grid"), request.data.get("points"))
+            validate_simulation_request(request.data, points=points)
+            cost = estimate_cost(request.data) * max(len(points), 1)
+            # Points solve in pool processes, which report their own CPU time
+            with admitted(request, request.data, cost, measure=False) as admission:
+                result = run_batch(request.data)
+                admission.cpu_seconds = result["cpu_seconds"]
+            return Response(result)
+        except ValueError as e:
+            return bad_request(e)
+        except Overloaded as e:
+            return overloaded_response(e)
+        except SimulationAborted as e:
+            return aborted_response(e)
+        except Exception as e:
+            logger.exception("Batch simulation failed")
+            return Response({"error": str(e)}, status=500)
+
+
+class CompareView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        data = request.data
         try:
-            result = run_simulation(data.get("battery_type"), data.get("params", {}),data.get("selected_model"))
+            variants = parse_variants(request.data)
+            validate_comparison(request.data, variants)
+            cost = sum(estimate_cost({**request.data, **variant}) for variant in variants)
+            # Models solve in pool processes, which report their own CPU time
+            with admitted(request, request.data, cost, measure=False) as admission:
+                result = run_comparison(request.data)
+                admission.cpu_seconds = result["cpu_seconds"]
+            for model in result["models"]:
+                if model["error"] is None:
+                    metrics.record_simulation(
+                        model["battery_type"], model["selected_model"], model["timings"]
+                    )
             return Response(result)
+        except ValueError as e:
+            return bad_request(e)
+        except Overloaded as e:
+            return overloaded_response(e)
+        except SimulationAborted as e:
+            return aborted_response(e)
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Model comparison failed")
             return Response({"error": str(e)}, status=500)
 
 
+def job_payload(job):
+    return {
+        "job_id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "completed_at": job.completed_at,
+        "error": job.error_message or None,
+        "status_url": f"/api/jobs/{job.id}/",
+        "result_url": f"/api/jobs/{job.id}/result/",
+    }
+
+
+class JobDetailView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = SimulationJob.objects.get(pk=job_id, user=request.user)
+        except SimulationJob.DoesNotExist:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_payload(job))
+
+
+class JobResultView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = SERIES_RENDERERS
+
+    def get(self, request, job_id):
+        try:
+            job = SimulationJob.objects.get(pk=job_id, user=request.user)
+        except SimulationJob.DoesNotExist:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        if job.status == "completed":
+            return Response(job.results)
+        if job.status == "failed":
+            return Response({"error": job.error_message}, status=500)
+        # Not finished yet, poll again later
+        return Response(job_payload(job), status=status.HTTP_202_ACCEPTED)
+
+
+def poll_job_events(job_id, last):
+    """Events for the job's state since progress ``last`` was sent, with its
+    current progress and whether it has finished."""
+    job = SimulationJob.objects.get(pk=job_id)
+    events = []
+    if job.progress is not None and job.progress != last:
+        events.append(format_event("progress", job.progress))
+    if job.status == "completed":
+        events.append(format_event("result", job.results))
+    elif job.is_finished():
+        events.append(format_event("error", {"error": job.error_message or job.status}))
+    return events, job.progress, job.is_finished()
+
+
+class JobEventsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request, job_id):
+        if not SimulationJob.objects.filter(pk=job_id, user=request.user).exists():
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        interval = getattr(settings, "SIMULATION_JOB_EVENTS_INTERVAL", 1.0)
+        lifetime = getattr(settings, "SIMULATION_JOB_EVENTS_MAX_SECONDS", 300)
+        # EventSource reconnects this long after the stream ends at its lifetime
+        retry = f"retry: {int(interval * 1000)}\n\n"
+
+        def stream():
+            yield retry
+            last, deadline = None, time.monotonic() + lifetime
+            while True:
+                events, last, finished = poll_job_events(job_id, last)
+                yield from events
+                if finished or time.monotonic() >= deadline:
+                    return
+                time.sleep(interval)
+
+        async def astream():
+            # Waits without holding a thread between polls
+            yield retry
+            last, deadline = None, time.monotonic() + lifetime
+            while True:
+                events, last, finished = await sync_to_async(poll_job_events)(job_id, last)
+                for event in events:
+                    yield event
+                if finished or time.monotonic() >= deadline:
+                    return
+                await asyncio.sleep(interval)
+
+        response = StreamingHttpResponse(
+            astream() if is_asgi(request) else stream(), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class RunPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class RunListView(generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = SimulationRunSerializer
+    pagination_class = RunPagination
+
+    def get_queryset(self):
+        return SimulationRun.objects.filter(user=self.request.user)
+
+
+class RunDetailView(generics.RetrieveAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = SimulationRunSerializer
+
+    def get_queryset(self):
+        return SimulationRun.objects.filter(user=self.request.user)
+
+
+class RunVariablesView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = SERIES_RENDERERS
+
+    def get(self, request, pk):
+        try:
+            run = SimulationRun.objects.get(pk=pk, user=request.user)
+        except SimulationRun.DoesNotExist:
+            return Response({"error": "Run not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        max_points = request.query_params.get("max_points")
+        try:
+            max_points = parse_max_points(max_points) if max_points else None
+        except InvalidRequest as e:
+            return bad_request(e)
+
+        # ?name=Time [s]&name=Voltage [V]; only these are read from disk
+        names = request.query_params.getlist("name") or ["Time [s]", "Voltage [V]"]
+        try:
+            series = load_variables(run.data_path, names)
+        except KeyError as e:
+            return Response({"error": f"Unknown variable: {e}"}, status=status.HTTP_404_NOT_FOUND)
+        except FileNotFoundError:
+            return Response({"error": "Run data is no longer available"}, status=status.HTTP_410_GONE)
+
+        if max_points:
+            series = downsample(series, max_points)
+        return Response(encode_series(series))
+
+
 class RegisterView(APIView):
     def post(self, request):
         data = request.data
@@ -240,90 +774,73 @@ Your App Team
 #             messages.error(request, 'User not found')
 #             return redirect('request_password_reset')
 
+def chat_error(e):
+    # Map OpenAI failures to the status the client should see
+    if isinstance(e, AuthenticationError):
+        logger.error("OpenAI API authentication failed")
+        return {'error': 'API authentication failed'}, 401
+    if isinstance(e, RateLimitError):
+        logger.error("OpenAI API rate limit exceeded")
+        return {'error': 'Rate limit exceeded. Please try again later.'}, 429
+    if isinstance(e, OpenAIError):
+        logger.error(f"OpenAI API error: {str(e)}")
+        return {'error': 'AI service temporarily unavailable'}, 503
+    logger.exception("Unexpected chat error")
+    return {'error': 'Internal server error'}, 500
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ChatbotView(View):
-    def post(self, request):
+    """Async chat endpoint, so a reply in progress only holds an await under
+    ASGI rather than a worker thread. Replies stream as ``token`` events
+    followed by ``done`` when the client asks for text/event-stream or sends
+    ``"stream": true``; otherwise the whole reply comes back as JSON."""
+
+    async def post(self, request):
         try:
-            # Parse the JSON data from request
             data = json.loads(request.body)
-            user_message = data.get('message', '')
-            conversation_history = data.get('history', [])
-            
-            if not user_message:
-                return JsonResponse({
-                    'error': 'Message is required'
-                }, status=400)
-            
-            # Prepare messages for OpenAI API
-            messages = []
-            
-            # Add system message (optional)
-            messages.append({
-                "role": "system",
-                "content": "You are a helpful assistant."
-            })
-            
-            # Add conversation history
-            # for msg in conversation_history:
-            #     messages.append({
-            #         "role": msg.get('role', 'user'),
-            #         "content": msg.get('content', '')
-            #     })
-            
-            # Add current user message
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
-            
-            # Call OpenAI API
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",  # or "gpt-4" if you have access
-                messages=messages,
-                max_tokens=1000,
-                temperature=0.7
-            )
-            print(response["choices"][0]["message"]["content"])
-
-            time.sleep(10)  
-            # Extract the assistant's response
-            assistant_message = response.choices[0].message.content
-            
-            return JsonResponse({
-                'response': assistant_message,
-                'status': 'success'
-            })
-        
         except json.JSONDecodeError:
-            return JsonResponse({
-                'error': 'Invalid JSON format'
-            }, status=400)
-            
-        except AuthenticationError:
-            logger.error("OpenAI API authentication failed")
-            return JsonResponse({
-                'error': 'API authentication failed'
-            }, status=401)
-            
-        except RateLimitError:
-            logger.error("OpenAI API rate limit exceeded")
-            return JsonResponse({
-                'error': 'Rate limit exceeded. Please try again later.'
-            }, status=429)
-            
-        except OpenAIError as e:
-            logger.error(f"OpenAI API error: {str(e)}")
-            return JsonResponse({
-                'error': 'AI service temporarily unavailable'
-            }, status=503)
-            
+            return JsonResponse({'error': 'Invalid JSON format'}, status=400)
+        user_message = data.get('message', '')
+        if not user_message:
+            return JsonResponse({'error': 'Message is required'}, status=400)
+        messages = build_messages(user_message)
+
+        if not (data.get('stream') or 'text/event-stream' in request.headers.get('Accept', '')):
+            try:
+                return JsonResponse({'response': await complete(messages), 'status': 'success'})
+            except Exception as e:
+                body, code = chat_error(e)
+                return JsonResponse(body, status=code)
+
+        tokens = stream_tokens(messages)
+        try:
+            # Wait for the first token so API errors still get their status
+            first = await anext(tokens, '')
         except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            return JsonResponse({
-                'error': 'Internal server error'
-            }, status=500)
-    
-    def get(self, request):
+            body, code = chat_error(e)
+            return JsonResponse(body, status=code)
+
+        async def events():
+            reply = [first]
+            try:
+                if first:
+                    yield format_event('token', {'content': first})
+                async for token in tokens:
+                    reply.append(token)
+                    yield format_event('token', {'content': token})
+                yield format_event('done', {'response': ''.join(reply), 'status': 'success'})
+            except Exception as e:
+                yield format_event('error', chat_error(e)[0])
+            finally:
+                await tokens.aclose()
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def get(self, request):
         return JsonResponse({
             'message': 'Chatbot API is running',
             'endpoints': {
@@ -1,6 +1,7 @@
-import React, { useState } from 'react';
-import axios from 'axios';
-import { ChevronDown, ChevronRight, Play, Upload } from 'lucide-react';
+import React, { useEffect, useMemo, useRef, useState } from 'react';
+import { ChevronDown, ChevronRight, Play, Square, Upload } from 'lucide-react';
+import Results, { LinePlot } from './Results';
+import { readEvents } from '../sse';
 
 const batteryModels = {
   'lithium-ion': {
@@ -57,6 +58,9 @@ const defaultParams = {
   'Simulation duration [s]': 3600,
 };
 
+// Request controls rather than PyBaMM parameters, accepted for every set
+const controlParams = ['C-rate', 'Simulation duration [s]'];
+
 export default function BatteryForm() {
   const [batteryType, setBatteryType] = useState('lithium-ion');
   const [selectedModel, setSelectedModel] = useState('SPM');
@@ -65,31 +69,159 @@ export default function BatteryForm() {
   const [isRunning, setIsRunning] = useState(false);
   const [result, setResult] = useState(null);
   const [activeTab, setActiveTab] = useState('model');
+  const [progress, setProgress] = useState(0);
+  const [steps, setSteps] = useState('');
+  const [cycles, setCycles] = useState(1);
+  const [driveCycle, setDriveCycle] = useState(null);
+  const [preview, setPreview] = useState(null);
+  const [catalog, setCatalog] = useState(null);
+  const abortRef = useRef(null);
+
+  // Parameter sets the server offers; the browser revalidates it by ETag
+  useEffect(() => {
+    fetch('http://localhost:8000/api/parameter-sets/', {
+      headers: { Authorization: `Bearer ${localStorage.getItem('access')}` },
+    })
+      .then((res) => (res.ok ? res.json() : null))
+      .then(setCatalog)
+      .catch(() => setCatalog(null));
+  }, []);
+
+  const chemistry = catalog?.chemistries[batteryType];
+  const availableSets = chemistry?.models[selectedModel]?.parameter_sets ?? parameterSets[batteryType];
+  // Only send a set the server knows, otherwise it uses the model's default
+  const requestedSet = chemistry && availableSets.includes(parameterSet) ? parameterSet : undefined;
+
+  // The server rejects names the set doesn't define, so leave those out
+  const setKeys = chemistry?.parameter_sets[requestedSet ?? availableSets[0]]?.keys;
+  const requestParams = useMemo(() => {
+    if (!setKeys) return params;
+    const known = new Set([...setKeys, ...controlParams]);
+    return Object.fromEntries(Object.entries(params).filter(([name]) => known.has(name)));
+  }, [params, setKeys]);
+
+  useEffect(() => {
+    if (availableSets.length && !availableSets.includes(parameterSet)) {
+      setParameterSet(availableSets[0]);
+    }
+  }, [availableSets, parameterSet]);
+
+  // Surrogate preview while editing parameters, the Simulate button confirms it
+  useEffect(() => {
+    if (activeTab !== 'parameters') return undefined;
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const res = await fetch('http://localhost:8000/api/simulate/preview/', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            Authorization: `Bearer ${localStorage.getItem('access')}`,
+          },
+          body: JSON.stringify({
+            battery_type: batteryType,
+            params: requestParams,
+            selected_model: selectedModel,
+            parameter_set: requestedSet,
+          }),
+          signal: controller.signal,
+        });
+        // 404 means no surrogate for this model
+        setPreview(res.ok ? await res.json() : null);
+      } catch (error) {
+        if (error.name !== 'AbortError') setPreview(null);
+      }
+    }, 250);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [activeTab, batteryType, selectedModel, requestParams, requestedSet]);
 
   const handleChange = (e) => {
     setParams({ ...params, [e.target.name]: parseFloat(e.target.value) });
   };
 
   const loadParameterSet = () => {
-    // Simulated parameter set loading
-    alert(`Loading parameter set: ${parameterSet} for ${batteryType}`);
+    const values = chemistry?.parameter_sets[parameterSet]?.values;
+    if (!values) {
+      alert(`Parameter set ${parameterSet} is not available for ${batteryType}`);
+      return;
+    }
+    // Fill in the fields the set defines, controls such as C-rate stay as they are
+    const loaded = { ...params };
+    Object.keys(params).forEach((name) => {
+      if (name in values) loaded[name] = values[name];
+    });
+    setParams(loaded);
+  };
+
+  const buildRequest = () => {
+    const payload = {
+      battery_type: batteryType,
+      params: requestParams,
+      selected_model: selectedModel,
+      parameter_set: requestedSet,
+    };
+    const lines = steps.split('\n').map((line) => line.trim()).filter(Boolean);
+    if (lines.length || driveCycle) {
+      payload.experiment = { cycles: Number(cycles) || 1 };
+      if (lines.length) payload.experiment.steps = lines;
+    }
+    if (!driveCycle) {
+      return { headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) };
+    }
+    // The CSV goes up as a file, the rest of the request rides along as JSON
+    const form = new FormData();
+    form.append('payload', JSON.stringify(payload));
+    form.append('drive_cycle', driveCycle);
+    return { headers: {}, body: form };
   };
 
   const handleSimulate = async () => {
     setIsRunning(true);
+    setProgress(0);
     const token = localStorage.getItem('access');
+    const controller = new AbortController();
+    abortRef.current = controller;
+    const { headers, body } = buildRequest();
     try {
-      const res = await axios.post(
-        'http://localhost:8000/api/simulate/',
-        { battery_type: batteryType, params,selected_model:selectedModel },
-        { headers: { Authorization: `Bearer ${token}` } }
-      );
-      setResult(res.data);
+      const res = await fetch('http://localhost:8000/api/simulate/stream/', {
+        method: 'POST',
+        headers: {
+          ...headers,
+          Accept: 'text/event-stream',
+          Authorization: `Bearer ${token}`,
+        },
+        body,
+        signal: controller.signal,
+      });
+      if (res.status === 400) {
+        // Per-field messages from the request validation
+        const { error, fields } = await res.json();
+        alert(fields ? `${error}:\n${JSON.stringify(fields, null, 2)}` : error);
+        return;
+      }
+      if (!res.ok) throw new Error(`Server responded with ${res.status}`);
+      await readEvents(res.body, (event, data) => {
+        if (event === 'progress') setProgress(data.progress);
+        else if (event === 'result') setResult(data);
+        else if (event === 'error') throw new Error(data.error);
+      });
     } catch (error) {
-      alert('Authentication failed or server error.');
-      console.error(error);
+      // Stopping a run aborts the request, that's not an error
+      if (error.name !== 'AbortError') {
+        alert('Authentication failed or server error.');
+        console.error(error);
+      }
+    } finally {
+      abortRef.current = null;
+      setIsRunning(false);
     }
-    setIsRunning(false);
+  };
+
+  const handleStop = () => {
+    if (abortRef.current) abortRef.current.abort();
   };
 
   return (
@@ -124,7 +256,9 @@ export default function BatteryForm() {
                   onChange={(e) => {
                     setBatteryType(e.target.value);
                     setSelectedModel(Object.keys(batteryModels[e.target.value])[0]);
-                    setParameterSet(parameterSets[e.target.value][0]);
+                    setParameterSet(
+                      catalog?.chemistries[e.target.value]?.default ?? parameterSets[e.target.value][0]
+                    );
                   }}
                   className="form-select"
                 >
@@ -159,7 +293,7 @@ export default function BatteryForm() {
                     onChange={(e) => setParameterSet(e.target.value)}
                     className="form-select me-2"
                   >
-                    {parameterSets[batteryType].map((set) => (
+                    {availableSets.map((set) => (
                       <option key={set} value={set}>
                         {set}
                       </option>
@@ -170,12 +304,47 @@ export default function BatteryForm() {
                   </button>
                 </div>
               </div>
+
+              <div className="col-md-8">
+                <label className="form-label">Experiment Protocol (one step per line, optional)</label>
+                <textarea
+                  className="form-control"
+                  rows={4}
+                  value={steps}
+                  onChange={(e) => setSteps(e.target.value)}
+                  placeholder={'Discharge at 1C until 3.0 V\nRest for 10 minutes\nCharge at C/2 until 4.1 V\nHold at 4.1 V until 50 mA'}
+                />
+              </div>
+
+              <div className="col-md-4">
+                <label className="form-label">Cycles</label>
+                <input
+                  type="number"
+                  min="1"
+                  className="form-control mb-3"
+                  value={cycles}
+                  onChange={(e) => setCycles(e.target.value)}
+                />
+                <label className="form-label">Drive Cycle (CSV of time [s], current [A])</label>
+                <input
+                  type="file"
+                  accept=".csv,text/csv"
+                  className="form-control"
+                  onChange={(e) => setDriveCycle(e.target.files[0] || null)}
+                />
+              </div>
               <div className="d-flex justify-content-end mt-4">
+            {isRunning && (
+              <button className="btn btn-outline-danger btn-lg me-2" onClick={handleStop}>
+                <Square size={18} className="me-2" />
+                Stop
+              </button>
+            )}
             <button className="btn btn-primary btn-lg" onClick={handleSimulate} disabled={isRunning}>
               {isRunning ? (
                 <>
                   <span className="spinner-border spinner-border-sm me-2" role="status" aria-hidden="true"></span>
-                  Simulating...
+                  Simulating... {Math.round(progress * 100)}%
                 </>
               ) : (
                 <>
@@ -191,6 +360,18 @@ export default function BatteryForm() {
           {/* --- PARAMETERS TAB --- */}
           {activeTab === 'parameters' && (
             <div className="row">
+              {preview && (
+                <div className="col-12 mb-4">
+                  <LinePlot x={preview.time} y={preview.voltage} xLabel="Time [s] (preview)" yLabel="Voltage [V]" />
+                  <small className="text-muted">
+                    Surrogate preview, about ±{(preview.error_estimate * 1000).toFixed(0)} mV
+                    {preview.extrapolated && ', outside the trained range'}
+                    {preview.ignored_parameters.length > 0 &&
+                      `, ignores ${preview.ignored_parameters.join(', ')}`}
+                    . Simulate to confirm with a full solve.
+                  </small>
+                </div>
+              )}
               {Object.keys(params).map((key) => (
                 <div className="col-md-4 mb-3" key={key}>
                   <label className="form-label">{key}</label>
@@ -205,11 +386,17 @@ export default function BatteryForm() {
                 </div>
               ))}
               <div className="d-flex justify-content-end mt-4">
+            {isRunning && (
+              <button className="btn btn-outline-danger btn-lg me-2" onClick={handleStop}>
+                <Square size={18} className="me-2" />
+                Stop
+              </button>
+            )}
             <button className="btn btn-primary btn-lg" onClick={handleSimulate} disabled={isRunning}>
               {isRunning ? (
                 <>
                   <span className="spinner-border spinner-border-sm me-2" role="status" aria-hidden="true"></span>
-                  Simulating...
+                  Simulating... {Math.round(progress * 100)}%
                 </>
               ) : (
                 <>
@@ -223,22 +410,13 @@ export default function BatteryForm() {
             
           )}
 
-        {activeTab === 'results' && (
+        {activeTab === 'results' && result && (
         <div className="card shadow mt-4">
           <div className="card-header bg-success text-white">
             <h2 className="h5 mb-0">Simulation Results</h2>
           </div>
           <div className="card-body">
-            {result.plot_base64 ? (
-              <img
-                src={`data:image/png;base64,${result.plot_base64}`}
-                alt="Simulation Plot"
-                style={{ maxWidth: '100%', height: 'auto', border: '1px solid #ccc', borderRadius: '8px' }}
-              />
-            ) : (
-              <p>No plot image returned from simulation.</p>
-            )}
-            <pre className="mt-3">{JSON.stringify(result.summary, null, 2)}</pre>
+            <Results data={result} />
           </div>
         </div>
       )}
@@ -253,16 +431,7 @@ export default function BatteryForm() {
             <h2 className="h5 mb-0">Simulation Results</h2>
           </div>
           <div className="card-body">
-            {result.plot_base64 ? (
-              <img
-                src={`data:image/png;base64,${result.plot_base64}`}
-                alt="Simulation Plot"
-                style={{ maxWidth: '100%', height: 'auto', border: '1px solid #ccc', borderRadius: '8px' }}
-              />
-            ) : (
-              <p>No plot image returned from simulation.</p>
-            )}
-            <pre className="mt-3">{JSON.stringify(result.summary, null, 2)}</pre>
+            <Results data={result} />
           </div>
         </div>
       )}
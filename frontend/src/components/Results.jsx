@@ -1,11 +1,106 @@
-import React from "react";
+import React, { useMemo, useState } from "react";
+
+const WIDTH = 800;
+const HEIGHT = 320;
+const PADDING = 50;
+
+// Series arrive as base64 little-endian float32, see pybamm_runner.encode_series
+export function decodeSeries(series) {
+  const decoded = {};
+  Object.entries(series.variables).forEach(([name, b64]) => {
+    const bytes = Uint8Array.from(atob(b64), (c) => c.charCodeAt(0));
+    decoded[name] = new Float32Array(bytes.buffer);
+  });
+  return decoded;
+}
+
+export function LinePlot({ x, y, xLabel, yLabel }) {
+  let xMin = Infinity, xMax = -Infinity, yMin = Infinity, yMax = -Infinity;
+  for (let i = 0; i < x.length; i++) {
+    xMin = Math.min(xMin, x[i]);
+    xMax = Math.max(xMax, x[i]);
+    yMin = Math.min(yMin, y[i]);
+    yMax = Math.max(yMax, y[i]);
+  }
+  const xSpan = xMax - xMin || 1;
+  const ySpan = yMax - yMin || 1;
+  const sx = (v) => PADDING + ((v - xMin) / xSpan) * (WIDTH - 2 * PADDING);
+  const sy = (v) => HEIGHT - PADDING - ((v - yMin) / ySpan) * (HEIGHT - 2 * PADDING);
+
+  const points = Array.from(x, (v, i) => `${sx(v).toFixed(1)},${sy(y[i]).toFixed(1)}`).join(" ");
+
+  return (
+    <svg viewBox={`0 0 ${WIDTH} ${HEIGHT}`} style={{ width: "100%", height: "auto", border: "1px solid #ccc", borderRadius: "8px" }}>
+      <line x1={PADDING} y1={HEIGHT - PADDING} x2={WIDTH - PADDING} y2={HEIGHT - PADDING} stroke="#666" />
+      <line x1={PADDING} y1={PADDING} x2={PADDING} y2={HEIGHT - PADDING} stroke="#666" />
+      <polyline points={points} fill="none" stroke="#0d6efd" strokeWidth="2" />
+      <text x={PADDING} y={HEIGHT - PADDING + 18} fontSize="12">{xMin.toPrecision(4)}</text>
+      <text x={WIDTH - PADDING} y={HEIGHT - PADDING + 18} fontSize="12" textAnchor="end">{xMax.toPrecision(4)}</text>
+      <text x={PADDING - 6} y={HEIGHT - PADDING} fontSize="12" textAnchor="end">{yMin.toPrecision(4)}</text>
+      <text x={PADDING - 6} y={PADDING + 4} fontSize="12" textAnchor="end">{yMax.toPrecision(4)}</text>
+      <text x={WIDTH / 2} y={HEIGHT - 10} fontSize="13" textAnchor="middle">{xLabel}</text>
+      <text x={14} y={HEIGHT / 2} fontSize="13" textAnchor="middle" transform={`rotate(-90 14 ${HEIGHT / 2})`}>{yLabel}</text>
+    </svg>
+  );
+}
+
+function Metrics({ metrics }) {
+  // Metrics the model can't provide come back as null
+  const rows = Object.entries(metrics || {}).filter(([, value]) => value !== null);
+  if (!rows.length) return null;
+  return (
+    <table className="table table-sm mt-3">
+      <tbody>
+        {rows.map(([name, value]) => (
+          <tr key={name}>
+            <td>{name}</td>
+            <td className="text-end">{Number(value.toPrecision(4))}</td>
+          </tr>
+        ))}
+      </tbody>
+    </table>
+  );
+}
 
 export default function Results({ data }) {
+  const series = useMemo(() => (data.series ? decodeSeries(data.series) : null), [data]);
+  const [variable, setVariable] = useState("Voltage [V]");
+
+  if (data.plot_base64) {
+    return (
+      <div>
+        <img
+          src={`data:image/png;base64,${data.plot_base64}`}
+          alt="Simulation Plot"
+          style={{ maxWidth: "100%", height: "auto", border: "1px solid #ccc", borderRadius: "8px" }}
+        />
+        <Metrics metrics={data.metrics} />
+        <pre className="mt-3">{JSON.stringify(data.summary, null, 2)}</pre>
+      </div>
+    );
+  }
+
+  if (!series) {
+    return <p>No data returned from simulation.</p>;
+  }
+
+  const names = Object.keys(series).filter((name) => name !== "Time [s]");
+  const selected = series[variable] ? variable : names[0];
+
   return (
     <div>
-      <h2>Simulation Output</h2>
-      <img src={`data:image/png;base64,${data.plot_base64}`} alt="Result" />
-      <pre>{data.summary}</pre>
+      <div className="d-flex justify-content-end mb-2">
+        <select className="form-select w-auto" value={selected} onChange={(e) => setVariable(e.target.value)}>
+          {names.map((name) => (
+            <option key={name} value={name}>
+              {name}
+            </option>
+          ))}
+        </select>
+      </div>
+      <LinePlot x={series["Time [s]"]} y={series[selected]} xLabel="Time [s]" yLabel={selected} />
+      <Metrics metrics={data.metrics} />
+      <pre className="mt-3">{JSON.stringify(data.summary, null, 2)}</pre>
     </div>
   );
 }
@@ -1,6 +1,6 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { Send, Bot, User, Loader2 } from 'lucide-react';
-import axios from 'axios';
+import { readEvents } from '../sse';
 
 const ChatBot = () => {
   const [messages, setMessages] = useState([]);
@@ -9,6 +9,10 @@ const ChatBot = () => {
   const [error, setError] = useState('');
   const messagesEndRef = useRef(null);
 
+  useEffect(() => {
+    messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
+  }, [messages]);
+
 
   const sendMessage = async () => {
     if (!inputMessage.trim() || isLoading) return;
@@ -25,6 +29,7 @@ const ChatBot = () => {
     setIsLoading(true);
     setError('');
 
+    const botId = Date.now() + 1;
     try {
       // Prepare conversation history for API
       const history = messages.map(msg => ({
@@ -32,33 +37,35 @@ const ChatBot = () => {
         content: msg.content
       }));
 
-      const response = await axios.post(
-  'http://localhost:8000/api/chat/',
-  {
-    message: inputMessage,
-    history: history
-  },
-  {
-    headers: {
-      'Content-Type': 'application/json',
-    },
-    timeout: 30000
-  }
-);
-
-
-      const data = response.data;
-
-
-
-      const botMessage = {
-        id: Date.now() + 1,
-        content: data.response,
+      const res = await fetch('http://localhost:8000/api/chat/', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          Accept: 'text/event-stream',
+        },
+        body: JSON.stringify({ message: inputMessage, history, stream: true }),
+      });
+      if (!res.ok) {
+        const data = await res.json().catch(() => ({}));
+        throw new Error(data.error || `Server responded with ${res.status}`);
+      }
+
+      // Tokens are appended to the reply as they arrive
+      setMessages(prev => [...prev, {
+        id: botId,
+        content: '',
         role: 'assistant',
         timestamp: new Date().toLocaleTimeString()
-      };
-
-      setMessages(prev => [...prev, botMessage]);
+      }]);
+      await readEvents(res.body, (event, data) => {
+        if (event === 'token') {
+          setMessages(prev => prev.map(msg =>
+            msg.id === botId ? { ...msg, content: msg.content + data.content } : msg
+          ));
+        } else if (event === 'error') {
+          throw new Error(data.error);
+        }
+      });
     } catch (err) {
       setError(err.message);
       console.error('Chat error:', err);
@@ -152,7 +159,7 @@ const ChatBot = () => {
           </div>
         ))}
 
-        {isLoading && (
+        {isLoading && messages[messages.length - 1]?.role === 'user' && (
           <div className="flex items-start space-x-3">
             <div className="w-8 h-8 bg-blue-500 rounded-full flex items-center justify-center">
               <Bot className="w-5 h-5 text-white" />